@@ -2,13 +2,13 @@
 Main API router for anime poster identification
 Orchestrates RAG → Gemini fallback → AniList → AnimeThemes pipeline
 """
+import asyncio
 import logging
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from typing import Dict, Any, List, Optional
-import base64
 import numpy as np
 from pathlib import Path
 import shutil
@@ -96,6 +96,7 @@ def initialize_rag():
             index_path=str(DATA_DIR / "index.faiss"),
             metadata_path=str(DATA_DIR / "posters.json"),
             dimension=512,
+            mmap=True,  # Search-only: share index pages across workers
         )
         logger.info(f"[OK] RAG vector store initialized: {rag_store.index.ntotal} vectors loaded")
     except Exception as e:
@@ -194,11 +195,8 @@ async def identify_via_gemini(image_data: bytes, mime_type: str) -> str:
     Raises:
         HTTPException: If Gemini fails or image is not anime
     """
-    # Convert to base64 for Gemini
-    base64_image = base64.b64encode(image_data).decode('utf-8')
-    
-    # Call Gemini service
-    result = await identify_anime_from_poster(base64_image, mime_type)
+    # Call Gemini service with the raw upload bytes
+    result = await identify_anime_from_poster(image_data, mime_type)
     
     if not result.is_anime:
         raise HTTPException(
@@ -217,7 +215,7 @@ async def identify_poster(
     file: UploadFile = File(...),
     force_rag: Optional[bool] = Query(False, description="Force RAG-only mode (no Gemini fallback, for testing)"),
     similarity_threshold: Optional[float] = Query(0.70, description="Minimum similarity for RAG match (0.0-1.0)")
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Main identification endpoint.
     
@@ -276,7 +274,7 @@ async def identify_poster(
             if force_rag:
                 # Force RAG mode: fail with debugging info
                 logger.warning("RAG match not found and force_rag=true, returning error")
-                return JSONResponse({
+                return ORJSONResponse({
                     'success': False,
                     'error': 'No RAG match found',
                     'ragDebug': {
@@ -344,7 +342,7 @@ async def identify_poster(
             response_data['canReportIncorrect'] = True
             response_data['reportMessage'] = 'Was this identification incorrect?'
         
-        return JSONResponse(response_data)
+        return ORJSONResponse(response_data)
         
     except HTTPException:
         # Re-raise HTTP exceptions (they already have proper status codes)
@@ -364,8 +362,6 @@ async def fetch_themes_in_parallel(anime_title: str) -> tuple[List[Dict], List[D
     Returns:
         Tuple of (api_themes, gemini_themes)
     """
-    import asyncio
-    
     api_task = fetch_themes_from_api(anime_title)
     gemini_task = fetch_supplemental_themes(anime_title)
     
@@ -405,11 +401,12 @@ def merge_theme_data(api_themes: List[Dict], gemini_themes: List[Dict]) -> List[
         logger.info("No supplemental OSTs from Gemini")
         return api_themes
     
-    # Inject Gemini OSTs into the first season from API
+    # Inject Gemini OSTs into a copy of the first season from API
+    # (api_themes may be a cached result shared between requests)
     merged = api_themes.copy()
     if merged:
         existing_osts = merged[0].get('osts', [])
-        merged[0]['osts'] = existing_osts + extra_osts
+        merged[0] = {**merged[0], 'osts': existing_osts + extra_osts}
         logger.info(f"Added {len(extra_osts)} OSTs from Gemini to API themes")
     
     return merged
@@ -423,7 +420,7 @@ async def confirm_and_ingest(
     confirmed_title: str = Query(..., description="User-confirmed anime title"),
     source: str = Query("gemini", description="Source of identification: 'gemini', 'user_correction', 'manual'"),
     save_image: str = Query("true", description="Whether to save poster image to disk")
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Confirm anime identification and add poster to RAG database.
     
@@ -503,7 +500,7 @@ async def confirm_and_ingest(
         if result.get('was_duplicate'):
             message += " (Added as variant due to name collision)"
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': True,
             'message': message,
             'slug': result['slug'],
@@ -526,7 +523,7 @@ async def confirm_and_ingest(
 
 
 @router.get("/trending")
-async def get_trending_anime() -> JSONResponse:
+async def get_trending_anime() -> ORJSONResponse:
     """
     Get trending anime from AniList.
     Used for homepage featured content.
@@ -536,7 +533,7 @@ async def get_trending_anime() -> JSONResponse:
     """
     try:
         trending = await fetch_trending_anime()
-        return JSONResponse({'success': True, 'data': trending})
+        return ORJSONResponse({'success': True, 'data': trending})
     except Exception as e:
         logger.error(f"Error fetching trending: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -549,7 +546,7 @@ async def search_anime_endpoint(
     query: str = Query(..., description="Search query for anime titles"),
     page: int = Query(1, description="Page number", ge=1),
     per_page: int = Query(10, description="Results per page", ge=1, le=50)
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Search for anime titles on AniList.
     
@@ -582,7 +579,7 @@ async def search_anime_endpoint(
         
         logger.info(f"[SEARCH-ANIME] Found {len(result.get('results', []))} results")
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': True,
             'pageInfo': result.get('pageInfo', {}),
             'results': result.get('results', [])
@@ -600,7 +597,7 @@ async def search_anime_endpoint(
 async def fetch_themes_by_title(
     request: Request,
     title: str = Query(..., description="Anime title to fetch themes for")
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Fetch theme songs for a given anime title without re-identifying.
     
@@ -627,14 +624,14 @@ async def fetch_themes_by_title(
         logger.info(f"[FETCH-THEMES] Fetching themes for: '{title}'")
         
         # Fetch themes from both sources
-        api_themes, gemini_themes = await fetch_themes_parallel(title.strip())
+        api_themes, gemini_themes = await fetch_themes_in_parallel(title.strip())
         
         # Merge themes
         merged_themes = merge_theme_data(api_themes, gemini_themes)
         
         logger.info(f"[FETCH-THEMES] Retrieved {len(merged_themes)} theme collections")
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': True,
             'themeData': merged_themes
         })
@@ -648,7 +645,7 @@ async def fetch_themes_by_title(
 
 @router.post("/youtube-search")
 @limiter.limit("20/minute")
-async def search_youtube_video(request: Request, request_body: Dict[str, str]) -> JSONResponse:
+async def search_youtube_video(request: Request, request_body: Dict[str, str]) -> ORJSONResponse:
     """
     Search for YouTube video ID using Gemini.
     
@@ -668,12 +665,12 @@ async def search_youtube_video(request: Request, request_body: Dict[str, str]) -
         video_id = await find_youtube_video_id(query)
         
         if not video_id:
-            return JSONResponse({
+            return ORJSONResponse({
                 'success': False,
                 'message': 'Could not find a suitable YouTube video'
             })
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': True,
             'videoId': video_id
         })
@@ -683,8 +680,46 @@ async def search_youtube_video(request: Request, request_body: Dict[str, str]) -
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/youtube-search-batch")
+@limiter.limit("5/minute")
+async def search_youtube_videos_batch(request: Request, request_body: Dict[str, List[str]]) -> ORJSONResponse:
+    """
+    Search for YouTube video IDs for several songs at once.
+    
+    Lookups run concurrently (bounded), so a whole season's songs resolve in
+    about the time of the slowest one.
+    
+    Request body:
+        queries: List of search queries (max 50)
+    
+    Returns:
+        JSON with success flag and videoIds (query → video ID or null)
+    """
+    try:
+        from services.gemini_service import find_youtube_video_ids
+        
+        queries = [q for q in request_body.get('queries') or [] if isinstance(q, str) and q.strip()]
+        if not queries:
+            raise HTTPException(status_code=400, detail="Queries parameter is required")
+        if len(queries) > 50:
+            raise HTTPException(status_code=400, detail="At most 50 queries per request")
+        
+        video_ids = await find_youtube_video_ids(queries)
+        
+        return ORJSONResponse({
+            'success': True,
+            'videoIds': video_ids
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"YouTube batch search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/stats")
-async def get_rag_stats() -> JSONResponse:
+async def get_rag_stats() -> ORJSONResponse:
     """
     Get RAG database statistics.
     
@@ -702,13 +737,13 @@ async def get_rag_stats() -> JSONResponse:
     """
     try:
         if rag_store is None:
-            return JSONResponse({
+            return ORJSONResponse({
                 'success': False,
                 'error': 'RAG store not initialized',
                 'isHealthy': False
             })
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': True,
             'indexSize': rag_store.index.ntotal,
             'metadataCount': len(rag_store.metadata),
@@ -718,7 +753,7 @@ async def get_rag_stats() -> JSONResponse:
         })
     except Exception as e:
         logger.error(f"Error fetching stats: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             'success': False,
             'error': str(e),
             'isHealthy': False
@@ -729,7 +764,7 @@ async def get_rag_stats() -> JSONResponse:
 async def verify_ingestion(
     file: UploadFile = File(...),
     expected_slug: str = Query(..., description="Expected slug of the ingested poster")
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Verify that a poster was successfully ingested by checking if it matches in RAG.
     
@@ -760,7 +795,7 @@ async def verify_ingestion(
         results = rag_store.search(embedding, k=1)
         
         if not results:
-            return JSONResponse({
+            return ORJSONResponse({
                 'success': False,
                 'verified': False,
                 'error': 'No matches found in database'
@@ -772,7 +807,7 @@ async def verify_ingestion(
             top_match.similarity >= 0.95
         )
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': True,
             'verified': is_verified,
             'topMatch': {
@@ -798,7 +833,7 @@ async def verify_ingestion(
 async def validate_image_endpoint(
     request: Request,
     file: UploadFile = File(...)
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Validate an image without processing it.
     
@@ -816,14 +851,14 @@ async def validate_image_endpoint(
         image_data = await file.read()
         is_valid, error_msg, metadata = validate_image(image_data)
         
-        return JSONResponse({
+        return ORJSONResponse({
             'success': is_valid,
             'message': error_msg,
             'metadata': metadata
         })
     except Exception as e:
         logger.error(f"Error in validate-image: {e}", exc_info=True)
-        return JSONResponse({
+        return ORJSONResponse({
             'success': False,
             'message': f"Validation error: {str(e)}",
             'metadata': {}
@@ -57,6 +57,8 @@ from fastapi.responses import JSONResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 import api.routes as routes
+from services import anilist_service, animethemes_service, youtube_service
+from rag._bruteforce import warmup as brute_force_warmup
 
 # Initialize rate limiter
 # Uses client IP address for rate limit tracking
@@ -79,10 +81,18 @@ async def lifespan(app: FastAPI):
         logger.info(f"[OK] RAG System: OPERATIONAL")
         logger.info(f"     - Index vectors: {routes.rag_store.index.ntotal}")
         logger.info(f"     - ID mappings: {len(routes.rag_store.id_to_slug)}")
-        logger.info(f"     - Metadata entries: {len(routes.rag_store.metadata)}")
     else:
         logger.warning("[WARNING] RAG System: NOT INITIALIZED (will fallback to Gemini only)")
 
+    # Compile the small-index search kernel before the first search
+    try:
+        brute_force_warmup()
+    except Exception:
+        logger.exception("Exception while compiling the brute-force search kernel")
+
+    # Open the pooled AniList connection before the first request needs it
+    await anilist_service.warmup()
+
     logger.info("="*60)
 
     try:
@@ -91,6 +101,11 @@ async def lifespan(app: FastAPI):
         logger.info("="*60)
         logger.info("[SHUTDOWN] AniMiKyoku Backend Stopping...")
         logger.info("="*60)
+        
+        # Release pooled HTTP connections
+        await anilist_service.close_client()
+        await animethemes_service.close_client()
+        await youtube_service.close_client()
 
 app = FastAPI(
     title="AniMiKyoku API",
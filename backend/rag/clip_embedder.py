@@ -10,9 +10,10 @@ Converts anime poster images into 512-dimensional embedding vectors using OpenAI
 
 import torch
 import open_clip
+import faiss
 from PIL import Image
 import numpy as np
-from typing import Union
+from typing import Sequence, Union
 import io
 import logging
 
@@ -62,6 +63,25 @@ def load_clip_model(model_name: str = "ViT-B-32", pretrained: str = "openai"):
     return _model_cache
 
 
+def load_rgb_image(image: Union[bytes, Image.Image]) -> Image.Image:
+    """
+    Decode image bytes (if needed) and convert to RGB.
+    
+    Module-level and model-free so it can run in worker processes.
+    """
+    # Convert bytes to PIL Image if needed
+    if isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+        logger.debug(f"Loaded image from bytes: {image.size} pixels, mode={image.mode}")
+    
+    # Ensure RGB mode (CLIP expects 3 color channels)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+        logger.debug(f"Converted image to RGB mode")
+    
+    return image
+
+
 async def generate_embedding(image: Union[bytes, Image.Image]) -> np.ndarray:
     """
     Generate a 512-dimensional embedding vector from an image.
@@ -80,15 +100,8 @@ async def generate_embedding(image: Union[bytes, Image.Image]) -> np.ndarray:
     # Load the cached model
     model, preprocess = load_clip_model()
     
-    # Convert bytes to PIL Image if needed
-    if isinstance(image, bytes):
-        image = Image.open(io.BytesIO(image))
-        logger.debug(f"Loaded image from bytes: {image.size} pixels, mode={image.mode}")
-    
-    # Ensure RGB mode (CLIP expects 3 color channels)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-        logger.debug(f"Converted image to RGB mode")
+    # Decode bytes and ensure RGB mode
+    image = load_rgb_image(image)
     
     # Preprocess: resize, center crop, normalize
     # This transforms the image to what CLIP expects (224x224, normalized colors)
@@ -117,6 +130,44 @@ async def generate_embedding(image: Union[bytes, Image.Image]) -> np.ndarray:
     return embedding_array
 
 
+async def generate_embeddings_batch(
+    images: Sequence[Union[bytes, Image.Image, torch.Tensor]]
+) -> np.ndarray:
+    """
+    Generate embeddings for many images with a single CLIP forward pass.
+    
+    Args:
+        images: Raw bytes, PIL images, or already-preprocessed [3, 224, 224]
+            tensors (e.g. produced by worker processes). Tensors are used as-is.
+    
+    Returns:
+        (N, 512) float32 array of unit-length embeddings, in input order
+    
+    The image encoder is matmul-bound, so one batched forward pass is
+    much faster than N single-image passes.
+    """
+    if not images:
+        return np.empty((0, 512), dtype=np.float32)
+    
+    model, preprocess = load_clip_model()
+    
+    tensors = [
+        image if isinstance(image, torch.Tensor) else preprocess(load_rgb_image(image))
+        for image in images
+    ]
+    batch = torch.stack(tensors)
+    logger.debug(f"Preprocessed batch tensor shape: {batch.shape}")  # [N, 3, 224, 224]
+    
+    with torch.no_grad():
+        embeddings = model.encode_image(batch)
+    
+    # Normalize to unit length in place with FAISS's SIMD kernel, so stored
+    # vectors are exactly what IndexFlatIP expects for cosine similarity
+    out = np.ascontiguousarray(embeddings.cpu().numpy(), dtype=np.float32)
+    faiss.normalize_L2(out)
+    return out
+
+
 def cosine_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
     """
     Calculate cosine similarity between two embeddings.
@@ -34,6 +34,20 @@ logger = logging.getLogger(__name__)
 import threading
 _index_lock = threading.Lock()
 
+# Runs of anything outside basic latin lowercase/digits (underscores included)
+_NON_SNAKE_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _nfkc(text: str) -> str:
+    """NFKC-normalize `text`, skipping the codepoint walk when it's a no-op.
+    
+    ASCII is always NFKC-stable, and is_normalized() is the Unicode quick
+    check, so only strings that actually change pay for normalize().
+    """
+    if text.isascii() or unicodedata.is_normalized("NFKC", text):
+        return text
+    return unicodedata.normalize("NFKC", text)
+
 
 def normalize_title_to_slug(title: str) -> str:
     """
@@ -56,19 +70,14 @@ def normalize_title_to_slug(title: str) -> str:
         return "unknown"
     
     # Unicode normalization
-    s = unicodedata.normalize("NFKC", title)
+    s = _nfkc(title)
     
     # Convert to lowercase
     s = s.lower()
     
-    # Replace common separators with underscore
-    s = s.replace(" ", "_").replace("-", "_")
-    
-    # Remove non-alphanumeric except underscore
-    s = re.sub(r"[^a-z0-9_]+", "_", s)
-    
-    # Collapse multiple underscores
-    s = re.sub(r"_+", "_", s)
+    # Replace separators, other non-alphanumerics and underscore runs with a
+    # single underscore in one pass
+    s = _NON_SNAKE_RE.sub("_", s)
     
     # Strip leading/trailing underscores
     s = s.strip("_")
@@ -124,11 +133,16 @@ async def ingest_poster(
     source: str = "gemini",
     save_image: bool = True,
     file_extension: str = ".jpg",
-    metadata_overrides: Optional[Dict[str, Any]] = None
+    metadata_overrides: Optional[Dict[str, Any]] = None,
+    embedding: Optional[np.ndarray] = None
 ) -> Dict[str, Any]:
     """
     Add a new anime poster to the RAG database.
     
+    Pass `embedding` when the caller already ran CLIP on `image_bytes`
+    (e.g. after a failed RAG search) to skip decoding and embedding the
+    image a second time.
+    
     Error Handling:
     ---------------
     - If embedding generation fails: raises exception, no changes made
@@ -143,8 +157,9 @@ async def ingest_poster(
         logger.info(f"  Normalized slug: {base_slug}")
         
         # Step 2: Generate embedding BEFORE acquiring lock (expensive operation)
-        logger.info("  Generating CLIP embedding...")
-        embedding = await generate_embedding(image_bytes)
+        if embedding is None:
+            logger.info("  Generating CLIP embedding...")
+            embedding = await generate_embedding(image_bytes)
         embedding_norm = np.linalg.norm(embedding)
         logger.info(f"  ✓ Embedding generated: shape={embedding.shape}, norm={embedding_norm:.6f}")
         
@@ -16,14 +16,45 @@ FAISS IndexFlatIP computes this inner product efficiently using:
 
 import faiss
 import numpy as np
-import json
+import os
 from pathlib import Path
 from typing import List, Optional, Dict, Tuple
 from dataclasses import dataclass
 import logging
 
+from rag._bruteforce import brute_topk
+from utils.json_io import load_json, dump_json
+
 logger = logging.getLogger(__name__)
 
+# Supported storage formats for new indexes.
+# 'none' keeps full FP32 vectors (IndexFlatIP); 'fp16' stores half-precision
+# components via IndexScalarQuantizer (2x smaller, no statistics needed);
+# 'int8' stores one byte per component (4x smaller, requires training).
+QUANTIZATION_TYPES = {
+    'none': None,
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+    'int8': faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Index variants and the file suffix each is stored under, so a compressed
+# IVF-PQ index can live alongside the exact Flat one (index.faiss →
+# index.pq.faiss).
+INDEX_KINDS = {
+    'flat': '.faiss',
+    'ivfpq': '.pq.faiss',
+}
+
+# IVF-PQ layout: 32 sub-quantizers × 8 bits = 32 bytes per vector (16x
+# smaller than FP32). PQ training needs at least 2^8 vectors.
+IVFPQ_M = 32
+IVFPQ_NBITS = 8
+IVFPQ_MIN_TRAINING_VECTORS = 1 << IVFPQ_NBITS
+
+# Below this many vectors, exact search on a Flat index runs through the
+# compiled brute-force kernel: FAISS's per-call overhead exceeds the compute.
+BRUTEFORCE_MAX_VECTORS = 500
+
 
 @dataclass
 class SearchResult:
@@ -67,7 +98,12 @@ class VectorStore:
         self, 
         index_path: str, 
         metadata_path: str, 
-        dimension: int = 512
+        dimension: int = 512,
+        quantization: str = 'none',
+        mmap: bool = False,
+        index_kind: str = 'flat',
+        nlist: int = 64,
+        nprobe: int = 8
     ):
         """
         Initialize or load vector store.
@@ -76,31 +112,82 @@ class VectorStore:
             index_path: Path to FAISS index file (.faiss)
             metadata_path: Path to poster metadata JSON
             dimension: Embedding dimension (512 for ViT-B-32)
+            quantization: Storage format for a NEW index ('none', 'fp16' or 'int8').
+                Ignored when an existing index is loaded from disk.
+            mmap: Memory-map an existing index read-only instead of copying it
+                into process memory. Pages are shared across worker processes
+                and loaded on demand; the store becomes search-only.
+            index_kind: 'flat' (exact, index_path as given) or 'ivfpq'
+                (compressed approximate index stored next to it with a
+                .pq.faiss suffix). quantization only applies to 'flat'.
+            nlist: Number of IVF clusters for a NEW 'ivfpq' index
+            nprobe: Clusters visited per query on an 'ivfpq' index
+                (higher = better recall, slower)
         
         Technical Details:
             - Dimension must match CLIP output (512)
             - IndexFlatIP uses 4 bytes per dimension per vector
             - Memory: 235 vectors × 512 dims × 4 bytes ≈ 480KB (tiny!)
+            - 'fp16' uses 2 bytes per dimension (≈240KB), effectively lossless
+              for CLIP embeddings
+            - 'int8' uses 1 byte per dimension (≈120KB) at <1% recall loss
+            - 'ivfpq' uses 32 bytes per vector; only worth it past ~10K vectors
         """
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(
+                f"Unknown quantization '{quantization}'. "
+                f"Expected one of: {', '.join(QUANTIZATION_TYPES)}"
+            )
+        if index_kind not in INDEX_KINDS:
+            raise ValueError(
+                f"Unknown index kind '{index_kind}'. "
+                f"Expected one of: {', '.join(INDEX_KINDS)}"
+            )
+        if index_kind != 'flat' and quantization != 'none':
+            raise ValueError("quantization only applies to index_kind='flat'")
+        
         self.index_path = Path(index_path)
+        if index_kind != 'flat':
+            self.index_path = self.index_path.with_suffix(INDEX_KINDS[index_kind])
         self.metadata_path = Path(metadata_path)
         self.dimension = dimension
+        self.quantization = quantization
+        self.index_kind = index_kind
+        self.nlist = nlist
+        
+        # True when the index is a read-only memory map (search-only store)
+        self._mmap = False
         
         # ID to slug mapping (FAISS uses integer IDs, we use slugs)
         self.id_to_slug: List[str] = []
         
+        # Poster metadata, parsed on first access (see the `metadata` property)
+        self._metadata: Optional[Dict] = None
+        
+        # Slugs whose metadata entry has an embedding (cached at metadata load)
+        self._has_embedding = set()
+        
+        # Display title / poster path per FAISS ID (built lazily by search)
+        self._titles: List[str] = []
+        self._paths: List[str] = []
+        
+        # Raw (N, D) copy of a small IndexFlatIP for brute_topk (built lazily)
+        self._mat: Optional[np.ndarray] = None
+        
         # Load or create FAISS index
         if self.index_path.exists():
             logger.info(f"Loading existing FAISS index from {self.index_path}")
-            self.index = faiss.read_index(str(self.index_path))
-            logger.info(f"[OK] Loaded index with {self.index.ntotal} vectors")
+            self.index = self._read_index(mmap)
+            logger.info(
+                f"[OK] Loaded index with {self.index.ntotal} vectors"
+                f"{' (memory-mapped, read-only)' if self._mmap else ''}"
+            )
             
             # Try to load the ID mapping
             mapping_path = self.index_path.with_suffix('.mapping.json')
             if mapping_path.exists():
                 logger.info(f"Loading ID mapping from {mapping_path}")
-                with open(mapping_path, 'r') as f:
-                    self.id_to_slug = json.load(f)
+                self.id_to_slug = load_json(mapping_path)
                 logger.info(f"[OK] Loaded ID mapping with {len(self.id_to_slug)} entries")
                 
                 # Validate mapping matches index size
@@ -115,26 +202,19 @@ class VectorStore:
                 logger.warning(f"[WARNING] Mapping file not found: {mapping_path}")
                 logger.info("Will attempt to rebuild from metadata...")
         else:
-            logger.info(f"Creating new FAISS IndexFlatIP (dimension={dimension})")
-            # IndexFlatIP: Flat index using Inner Product metric
-            # This is optimal for cosine similarity with normalized vectors
-            self.index = faiss.IndexFlatIP(dimension)
+            self.index = self._create_index()
             logger.info("[OK] New index created")
         
-        # Load metadata
-        if self.metadata_path.exists():
-            logger.info(f"Loading metadata from {self.metadata_path}")
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
-            logger.info(f"[OK] Loaded metadata for {len(self.metadata)} anime")
-            
-            # Rebuild ID mapping if not loaded from file OR if empty
-            if not self.id_to_slug and self.index.ntotal > 0:
-                logger.info("Rebuilding ID mapping from metadata...")
-                self._rebuild_mapping()
-        else:
-            logger.warning(f"[WARNING] Metadata file not found: {metadata_path}")
-            self.metadata = {}
+        # IVF indexes only scan the nprobe closest clusters per query
+        if isinstance(self.index, faiss.IndexIVF):
+            self.index.nprobe = nprobe
+        
+        # Rebuild ID mapping if not loaded from file OR if empty.
+        # Only this path needs metadata at startup; with a consistent
+        # mapping.json, posters.json is parsed on first search instead.
+        if not self.id_to_slug and self.index.ntotal > 0:
+            logger.info("Rebuilding ID mapping from metadata...")
+            self._rebuild_mapping()
         
         # Final validation
         if self.index.ntotal > 0 and len(self.id_to_slug) == 0:
@@ -145,9 +225,118 @@ class VectorStore:
         elif self.index.ntotal > 0:
             logger.info(
                 f"[READY] VectorStore: {self.index.ntotal} vectors, "
-                f"{len(self.id_to_slug)} mappings, {len(self.metadata)} metadata entries"
+                f"{len(self.id_to_slug)} mappings"
             )
     
+    @property
+    def metadata(self) -> Dict:
+        """
+        Poster metadata keyed by slug, loaded from metadata_path on first access.
+        
+        posters.json carries a 512-float embedding per anime, so parsing it
+        is the slowest part of startup; search() only needs it to resolve
+        titles and poster paths.
+        """
+        if self._metadata is None:
+            self._load_metadata()
+        return self._metadata
+    
+    def _load_metadata(self):
+        """Parse metadata_path and cache the set of slugs with embeddings."""
+        if self.metadata_path.exists():
+            logger.info(f"Loading metadata from {self.metadata_path}")
+            self._metadata = load_json(self.metadata_path)
+            logger.info(f"[OK] Loaded metadata for {len(self._metadata)} anime")
+        else:
+            logger.warning(f"[WARNING] Metadata file not found: {self.metadata_path}")
+            self._metadata = {}
+        
+        self._has_embedding = {
+            slug for slug, data in self._metadata.items()
+            if data.get('embedding') is not None
+        }
+    
+    def _read_index(self, mmap: bool) -> faiss.Index:
+        """
+        Read the index from disk, memory-mapping it when requested.
+        
+        Memory-mapped pages live in the OS page cache, so multiple worker
+        processes share one copy and startup doesn't copy the file into RSS.
+        Falls back to a regular in-memory read on FAISS builds without
+        IO_FLAG_MMAP or for index types that can't be mapped.
+        """
+        path = str(self.index_path)
+        
+        if mmap:
+            if hasattr(faiss, 'IO_FLAG_MMAP') and hasattr(faiss, 'IO_FLAG_READ_ONLY'):
+                try:
+                    index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                    self._mmap = True
+                    return index
+                except RuntimeError as e:
+                    logger.warning(f"[WARNING] Could not memory-map index, loading into memory: {e}")
+            else:
+                logger.warning("[WARNING] FAISS build lacks IO_FLAG_MMAP, loading index into memory")
+        
+        return faiss.read_index(path)
+    
+    def _ensure_writable(self):
+        """Raise if the index is a read-only memory map."""
+        if self._mmap:
+            raise RuntimeError(
+                "VectorStore was opened with mmap=True and is read-only. "
+                "Open it without mmap to add embeddings or save."
+            )
+    
+    def _create_index(self) -> faiss.Index:
+        """
+        Create an empty index for the configured quantization.
+        
+        - 'none': IndexFlatIP (exact FP32 inner product, no training)
+        - 'fp16': IndexScalarQuantizer with QT_fp16. Components are cast
+          to half precision; train() is a no-op but still part of the API.
+        - 'int8': IndexScalarQuantizer with QT_8bit. Each component is
+          stored as one byte; FAISS learns per-dimension min/max ranges
+          during train(), so the first batch must be representative.
+        """
+        if self.index_kind == 'ivfpq':
+            return self._create_ivfpq_index()
+        
+        qtype = QUANTIZATION_TYPES[self.quantization]
+        
+        if qtype is None:
+            logger.info(f"Creating new FAISS IndexFlatIP (dimension={self.dimension})")
+            # IndexFlatIP: Flat index using Inner Product metric
+            # This is optimal for cosine similarity with normalized vectors
+            return faiss.IndexFlatIP(self.dimension)
+        
+        logger.info(
+            f"Creating new FAISS IndexScalarQuantizer "
+            f"(dimension={self.dimension}, quantization={self.quantization})"
+        )
+        return faiss.IndexScalarQuantizer(
+            self.dimension, qtype, faiss.METRIC_INNER_PRODUCT
+        )
+    
+    def _create_ivfpq_index(self) -> faiss.Index:
+        """
+        Create an empty IndexIVFPQ (inverted file + product quantization).
+        
+        - A Flat inner-product quantizer assigns vectors to `nlist` clusters
+        - Each vector is split into IVFPQ_M sub-vectors, each encoded as an
+          8-bit centroid ID; queries score codes via lookup tables
+        - Must be trained (add_embeddings trains on the first batch)
+        """
+        logger.info(
+            f"Creating new FAISS IndexIVFPQ (dimension={self.dimension}, "
+            f"nlist={self.nlist}, M={IVFPQ_M}, nbits={IVFPQ_NBITS})"
+        )
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        return faiss.IndexIVFPQ(
+            quantizer, self.dimension, self.nlist, IVFPQ_M, IVFPQ_NBITS,
+            faiss.METRIC_INNER_PRODUCT
+        )
+    
     def _rebuild_mapping(self):
         """
         Rebuild the index ID → slug mapping from metadata.
@@ -160,17 +349,47 @@ class VectorStore:
         - Sort by slug for deterministic ordering
         - Maintain this order when adding vectors
         """
-        # Find all anime with embeddings
-        anime_with_embeddings = [
-            slug for slug, data in self.metadata.items()
-            if data.get('embedding') is not None
-        ]
+        # Anime with embeddings were collected when metadata was loaded;
+        # sort for deterministic ordering
+        if self._metadata is None:
+            self._load_metadata()
+        self.id_to_slug = sorted(self._has_embedding)
+        logger.info(f"Rebuilt mapping for {len(self.id_to_slug)} vectors")
+    
+    def _build_result_lookup(self):
+        """
+        Build per-ID title and poster path tables aligned with id_to_slug.
         
-        # Sort for deterministic ordering
-        anime_with_embeddings.sort()
+        Lets search() resolve results with plain list indexing instead of
+        a metadata dict lookup + two .get() calls per result.
+        """
+        titles = []
+        paths = []
+        for slug in self.id_to_slug:
+            anime_data = self.metadata.get(slug, {})
+            titles.append(anime_data.get('title', slug))
+            paths.append(anime_data.get('path', ''))
         
-        self.id_to_slug = anime_with_embeddings
-        logger.info(f"Rebuilt mapping for {len(self.id_to_slug)} vectors")
+        self._titles = titles
+        self._paths = paths
+    
+    def _bruteforce_matrix(self) -> Optional[np.ndarray]:
+        """
+        Return the raw vector matrix when brute-force search applies.
+        
+        Only exact FP32 Flat indexes below BRUTEFORCE_MAX_VECTORS qualify
+        (quantized codes can't be scored directly). The copy is refreshed
+        whenever the index size changes.
+        """
+        ntotal = self.index.ntotal
+        if ntotal >= BRUTEFORCE_MAX_VECTORS or not isinstance(self.index, faiss.IndexFlatIP):
+            self._mat = None
+            return None
+        
+        if self._mat is None or self._mat.shape[0] != ntotal:
+            self._mat = np.ascontiguousarray(self.index.reconstruct_n(0, ntotal), dtype='float32')
+        
+        return self._mat
     
     def add_embedding(self, slug: str, embedding: np.ndarray) -> int:
         """
@@ -185,7 +404,8 @@ class VectorStore:
         
         Mathematical Requirements:
             - embedding.shape must be (512,)
-            - ||embedding|| should be ≈ 1.0 (normalized)
+            - ||embedding|| should be ≈ 1.0 (normalized by the caller;
+              CLIP output already is, batch builders use faiss.normalize_L2)
         
         FAISS Operations:
             1. Validates dimension matches index
@@ -193,14 +413,19 @@ class VectorStore:
             3. Assigns sequential ID
             4. Updates internal structures for search
         """
+        self._ensure_writable()
+        
         # Validate embedding
         assert embedding.shape == (self.dimension,), \
             f"Expected shape ({self.dimension},), got {embedding.shape}"
         
-        # Verify normalization (should be ~1.0)
-        norm = np.linalg.norm(embedding)
-        if not (0.99 < norm < 1.01):
-            logger.warning(f"Embedding for {slug} not normalized: norm={norm:.6f}")
+        # Quantized indexes must be trained on a representative batch first;
+        # training on a single vector would collapse every dimension's range.
+        if not self.index.is_trained:
+            raise RuntimeError(
+                "Index is not trained. Use add_embeddings() with a representative "
+                "batch to train a quantized index before adding single vectors."
+            )
         
         # Reshape for FAISS (expects 2D array: [n_vectors, dimension])
         embedding_2d = embedding.reshape(1, -1).astype('float32')
@@ -216,6 +441,43 @@ class VectorStore:
         
         return idx
     
+    def add_embeddings(self, slugs: List[str], embeddings: np.ndarray) -> List[int]:
+        """
+        Add a batch of embeddings to the index in a single FAISS call.
+        
+        Args:
+            slugs: Anime identifiers, one per row of `embeddings`
+            embeddings: Normalized (N, 512) matrix
+        
+        Returns:
+            FAISS index IDs assigned to the batch (sequential integers)
+        
+        Notes:
+            - One index.add() over an (N, d) matrix is much faster than N
+              single-vector adds
+            - Untrained (quantized) indexes are trained on this batch first
+        """
+        self._ensure_writable()
+        
+        matrix = np.ascontiguousarray(embeddings, dtype='float32')
+        assert matrix.ndim == 2 and matrix.shape[1] == self.dimension, \
+            f"Expected shape (N, {self.dimension}), got {matrix.shape}"
+        assert len(slugs) == matrix.shape[0], \
+            f"Got {len(slugs)} slugs for {matrix.shape[0]} embeddings"
+        
+        if not self.index.is_trained:
+            logger.info(f"Training {type(self.index).__name__} on {matrix.shape[0]} vectors...")
+            self.index.train(matrix)
+        
+        self.index.add(matrix)
+        
+        start = len(self.id_to_slug)
+        self.id_to_slug.extend(slugs)
+        
+        logger.debug(f"Added {len(slugs)} vectors (total: {self.index.ntotal})")
+        
+        return list(range(start, len(self.id_to_slug)))
+    
     def search(
         self, 
         query_embedding: np.ndarray, 
@@ -275,46 +537,55 @@ class VectorStore:
             )
             return []
         
+        # Nothing to return; also keeps k=0 out of the compiled kernel,
+        # which indexes top_scores[k - 1] without bounds checks
+        if k <= 0:
+            return []
+        
         # Limit k to available vectors
         k = min(k, self.index.ntotal)
         
-        # Reshape for FAISS
-        query_2d = query_embedding.reshape(1, -1).astype('float32')
-        
-        # Perform search
-        # Returns: distances (inner products), indices (FAISS IDs)
-        distances, indices = self.index.search(query_2d, k)
+        mat = self._bruteforce_matrix()
+        if mat is not None:
+            # Tiny Flat index: compiled scan skips the FAISS call overhead
+            query = np.ascontiguousarray(query_embedding, dtype='float32')
+            sims, ids = brute_topk(mat, query, k)
+        else:
+            # Reshape for FAISS
+            query_2d = query_embedding.reshape(1, -1).astype('float32')
+            
+            # Perform search
+            # Returns: distances (inner products), indices (FAISS IDs)
+            distances, indices = self.index.search(query_2d, k)
+            sims = distances[0]
+            ids = indices[0]
+        
+        # Vectorized threshold filter (IndexFlatIP returns the inner product
+        # directly, which IS the cosine similarity for normalized vectors).
+        # FAISS pads missing results with ID -1, so mask those out too.
+        mask = (sims >= min_similarity) & (ids >= 0)
+        valid_ids = ids[mask].tolist()
+        valid_sims = sims[mask].tolist()
+        
+        # Per-ID title/path tables, rebuilt only after the mapping changes
+        if len(self._titles) != len(self.id_to_slug):
+            self._build_result_lookup()
+        
+        id_to_slug = self.id_to_slug
+        titles = self._titles
+        paths = self._paths
         
         # Convert to SearchResult objects
-        results = []
-        for i in range(k):
-            faiss_id = int(indices[0][i])
-            raw_distance = float(distances[0][i])
-            
-            # IndexFlatIP returns inner product directly (not negated)
-            # For normalized vectors, this IS the cosine similarity
-            similarity = raw_distance
-            
-            # Skip if below threshold
-            if similarity < min_similarity:
-                continue
-            
-            # Get anime info
-            if faiss_id >= len(self.id_to_slug):
-                logger.error(f"Invalid FAISS ID: {faiss_id}")
-                continue
-            
-            slug = self.id_to_slug[faiss_id]
-            anime_data = self.metadata.get(slug, {})
-            
-            result = SearchResult(
-                slug=slug,
-                anime_title=anime_data.get('title', slug),
-                similarity=similarity,
-                poster_path=anime_data.get('path', ''),
-                distance=raw_distance
+        results = [
+            SearchResult(
+                slug=id_to_slug[fid],
+                anime_title=titles[fid],
+                similarity=sim,
+                poster_path=paths[fid],
+                distance=sim
             )
-            results.append(result)
+            for fid, sim in zip(valid_ids, valid_sims)
+        ]
         
         logger.debug(f"Search returned {len(results)} results (k={k})")
         if results:
@@ -334,18 +605,28 @@ class VectorStore:
         Note: FAISS index only stores vectors, not the slug mapping.
         The mapping is reconstructed from metadata when loading.
         
+        Both files are written to a .tmp sibling and renamed over the
+        original. Another store may have the index memory-mapped (the API's
+        search store): rewriting it in place would change pages under the
+        mapping, while a rename leaves the old inode intact until reopened.
+        
         Performance:
             - Write: ~1-2ms
             - Read: ~5-10ms
         """
+        self._ensure_writable()
+        
         self.index_path.parent.mkdir(parents=True, exist_ok=True)
-        faiss.write_index(self.index, str(self.index_path))
+        temp_index = self.index_path.with_name(self.index_path.name + '.tmp')
+        faiss.write_index(self.index, str(temp_index))
+        os.replace(temp_index, self.index_path)
         logger.info(f"✅ Saved FAISS index to {self.index_path} ({self.index.ntotal} vectors)")
         
         # Also save the ID mapping separately for reconstruction
         mapping_path = self.index_path.with_suffix('.mapping.json')
-        with open(mapping_path, 'w') as f:
-            json.dump(self.id_to_slug, f, indent=2)
+        temp_mapping = mapping_path.with_name(mapping_path.name + '.tmp')
+        dump_json(self.id_to_slug, temp_mapping)
+        os.replace(temp_mapping, mapping_path)
         logger.info(f"✅ Saved ID mapping to {mapping_path}")
     
     def get_stats(self) -> Dict:
@@ -355,11 +636,14 @@ class VectorStore:
         Returns:
             Dictionary with index statistics
         """
+        # code_size = bytes stored per vector (d*4 Flat, d*2 FP16, d INT8)
+        bytes_per_vector = getattr(self.index, 'code_size', self.dimension * 4)
+        
         return {
             'total_vectors': self.index.ntotal,
             'dimension': self.dimension,
-            'index_type': 'IndexFlatIP',
-            'memory_usage_mb': (self.index.ntotal * self.dimension * 4) / (1024 * 1024),
+            'index_type': type(self.index).__name__,
+            'memory_usage_mb': (self.index.ntotal * bytes_per_vector) / (1024 * 1024),
             'metadata_count': len(self.metadata),
             'mapped_ids': len(self.id_to_slug)
         }
@@ -5,42 +5,121 @@ Generates CLIP embeddings for all anime posters and saves them to posters.json.
 
 Process:
 1. Scans data/posters/ for image files
-2. For each poster:
-   - Loads the image
-   - Generates 512-dimensional embedding using CLIP
-   - Updates metadata in posters.json
-3. Saves updated metadata with embeddings
+2. Worker processes decode + preprocess posters (resize, normalize)
+3. The main process runs CLIP on batches of preprocessed tensors
+   while the workers prepare the next batch
+4. Appends each batch to data/embeddings.bin (raw float32 rows) and
+   records slug → row in data/embeddings.progress.json
+5. Writes posters.json once at the end, then removes the checkpoint files
 
 Performance:
 - ~1-2 seconds per poster (CLIP inference)
 - 235 posters = ~4-8 minutes total
-- Can resume if interrupted (skips existing embeddings)
+- Can resume if interrupted (skips existing and checkpointed embeddings)
 
 Usage:
     python backend/scripts/build_embeddings.py
     python backend/scripts/build_embeddings.py --force  # Regenerate all
+    python backend/scripts/build_embeddings.py --workers 4 --batch-size 32
 """
 
 import asyncio
-import json
+import os
 import sys
 from pathlib import Path
 from datetime import datetime, timezone
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+import numpy as np
+import orjson
 
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from rag.clip_embedder import generate_embedding, load_clip_model
+from rag.clip_embedder import generate_embeddings_batch, load_clip_model, load_rgb_image
+from utils.json_io import load_json, dump_json
 
+EMBEDDING_DIM = 512
 
-async def build_embeddings(force_regenerate: bool = False):
+# Append-only checkpoint: raw float32 rows + slug → row index
+EMBEDDINGS_LOG = Path("data/embeddings.bin")
+PROGRESS_PATH = Path("data/embeddings.progress.json")
+
+# CLIP preprocessing transform, installed in each worker process
+_worker_preprocess = None
+
+
+def _init_preprocess_worker(preprocess):
+    """Pool initializer: store the CLIP transform for _preprocess_poster."""
+    global _worker_preprocess
+    _worker_preprocess = preprocess
+
+
+def _preprocess_poster(path: str):
+    """Read, decode and preprocess one poster (runs in a worker process)."""
+    with open(path, 'rb') as f:
+        image = load_rgb_image(f.read())
+    return _worker_preprocess(image)
+
+
+def _load_progress(force_regenerate: bool) -> dict:
+    """
+    Load the checkpoint of embeddings not yet merged into posters.json.
+    
+    Returns:
+        Dict of slug → {"row": int, "generated_at": str}
+    
+    The log is truncated to the rows the progress file knows about, so a
+    batch interrupted mid-write is simply embedded again.
+    """
+    if force_regenerate or not PROGRESS_PATH.exists():
+        EMBEDDINGS_LOG.unlink(missing_ok=True)
+        PROGRESS_PATH.unlink(missing_ok=True)
+        return {}
+    
+    progress = load_json(PROGRESS_PATH)
+    rows = max((entry['row'] for entry in progress.values()), default=-1) + 1
+    row_bytes = EMBEDDING_DIM * 4
+    
+    if not EMBEDDINGS_LOG.exists() or EMBEDDINGS_LOG.stat().st_size < rows * row_bytes:
+        print("   ⚠️ Embedding checkpoint is incomplete, starting over")
+        EMBEDDINGS_LOG.unlink(missing_ok=True)
+        PROGRESS_PATH.unlink(missing_ok=True)
+        return {}
+    
+    with open(EMBEDDINGS_LOG, 'r+b') as f:
+        f.truncate(rows * row_bytes)
+    
+    return progress
+
+
+def _save_progress(progress: dict):
+    """Durably write the (small) progress file via temp file + rename.
+    
+    A crash mid-write leaves the previous progress file intact instead of
+    a truncated one that the next resume can't parse.
+    """
+    temp_path = PROGRESS_PATH.with_suffix(PROGRESS_PATH.suffix + '.tmp')
+    with open(temp_path, 'wb') as f:
+        f.write(orjson.dumps(progress))
+        f.flush()
+        os.fsync(f.fileno())  # contents on disk before the rename publishes them
+    os.replace(temp_path, PROGRESS_PATH)
+
+
+async def build_embeddings(
+    force_regenerate: bool = False,
+    workers: int = None,
+    batch_size: int = 32
+):
     """
     Generate embeddings for all posters and update metadata.
     
     Args:
         force_regenerate: If True, regenerate all embeddings even if they exist
+        workers: Preprocessing processes (default: os.cpu_count())
+        batch_size: Posters per CLIP forward pass
     
     1. Pre-load CLIP model (expensive one-time operation)
     2. Load existing metadata from posters.json
@@ -52,7 +131,13 @@ async def build_embeddings(force_regenerate: bool = False):
     ---------------
     - Skips files that aren't in metadata
     - Continues on individual poster failures
-    - Saves progress periodically (every 10 posters)
+    - Saves progress periodically (after every batch)
+    
+    Pipeline:
+    ---------
+    JPEG decode + resize + normalize is CPU-bound and runs in a process
+    pool. While CLIP embeds batch i, the pool is already preprocessing
+    batch i+1, so the forward pass never waits on image decoding.
     """
     
     print("\n" + "="*60)
@@ -74,16 +159,20 @@ async def build_embeddings(force_regenerate: bool = False):
     
     # Pre-load CLIP model (takes ~2 seconds, do it once)
     print("\n⏳ Loading CLIP model...")
-    load_clip_model()
+    _, preprocess = load_clip_model()
     print("✅ Model loaded and ready")
     
     # Load metadata
     print(f"\n📂 Loading metadata from {metadata_path}...")
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        metadata = json.load(f)
+    metadata = load_json(metadata_path)
     
     print(f"   Found {len(metadata)} anime entries in metadata")
     
+    # Resume from an interrupted run (embeddings logged but not yet merged)
+    progress = _load_progress(force_regenerate)
+    if progress:
+        print(f"   Resuming: {len(progress)} embeddings already checkpointed")
+    
     # Get all poster files
     poster_files = list(posters_dir.glob("*"))
     poster_files = [f for f in poster_files if f.is_file() and f.suffix.lower() in ['.jpg', '.jpeg', '.png', '.jfif', '.webp']]
@@ -109,57 +198,48 @@ async def build_embeddings(force_regenerate: bool = False):
         if has_embedding and not force_regenerate:
             continue  # Skip, already has embedding
         
+        if file_stem in progress:
+            continue  # Skip, embedded by an interrupted run
+        
         work_queue.append((file_stem, poster_file))
     
-    if not work_queue:
+    if not work_queue and not progress:
         print("\n✅ All posters already have embeddings!")
         print("   Use --force to regenerate all embeddings")
         return
     
-    print(f"\n📊 Processing queue: {len(work_queue)} posters need embeddings")
-    
-    if force_regenerate:
-        print("   (Force mode: regenerating ALL embeddings)")
-    
-    # Process posters with progress bar
-    print("\n🧠 Generating embeddings...\n")
-    
     updated_count = 0
     failed_count = 0
     
-    # Use tqdm for a nice progress bar
-    for slug, poster_file in tqdm(work_queue, desc="Processing posters", unit="poster"):
-        try:
-            # Read image file
-            image_bytes = poster_file.read_bytes()
-            
-            # Generate embedding (the magic happens here!)
-            # This calls CLIP model: image → 512 numbers
-            embedding = await generate_embedding(image_bytes)
-            
-            # Convert numpy array to list for JSON serialization
-            embedding_list = embedding.tolist()
-            
-            # Update metadata
-            metadata[slug]['embedding'] = embedding_list
-            metadata[slug]['embedding_generated_at'] = datetime.now(timezone.utc).isoformat()
-            
-            updated_count += 1
-            
-            # Save progress every 10 posters (in case of interruption)
-            if updated_count % 10 == 0:
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=2, ensure_ascii=False)
-            
-        except Exception as e:
-            tqdm.write(f"   ❌ Failed to process {poster_file.name}: {e}")
-            failed_count += 1
-            continue
+    if work_queue:
+        print(f"\n📊 Processing queue: {len(work_queue)} posters need embeddings")
+        
+        if force_regenerate:
+            print("   (Force mode: regenerating ALL embeddings)")
+        
+        # Process posters with progress bar
+        print("\n🧠 Generating embeddings...\n")
+        
+        updated_count, failed_count = await _embed_queue(
+            work_queue, preprocess, progress, workers, batch_size
+        )
     
-    # Final save
+    # Merge checkpointed embeddings into metadata (one sequential read)
     print("\n💾 Saving final metadata...")
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    embeddings = np.fromfile(EMBEDDINGS_LOG, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    for slug, entry in progress.items():
+        if slug not in metadata:
+            continue
+        # orjson serializes the numpy row directly
+        metadata[slug]['embedding'] = embeddings[entry['row']]
+        metadata[slug]['embedding_generated_at'] = entry['generated_at']
+    
+    # Single posters.json write for the whole run
+    dump_json(metadata, metadata_path)
+    
+    # posters.json now holds everything; drop the checkpoint
+    EMBEDDINGS_LOG.unlink(missing_ok=True)
+    PROGRESS_PATH.unlink(missing_ok=True)
     
     # Summary
     print("\n" + "="*60)
@@ -182,6 +262,85 @@ async def build_embeddings(force_regenerate: bool = False):
         print(f"\n⚠️ {missing} posters still need embeddings")
 
 
+async def _embed_queue(work_queue, preprocess, progress, workers, batch_size):
+    """
+    Embed every (slug, poster_file) in the queue, appending to the checkpoint.
+    
+    Each batch is appended to EMBEDDINGS_LOG as raw float32 rows (O(batch)
+    bytes) and its slugs recorded in `progress`, instead of rewriting the
+    multi-MB posters.json after every batch.
+    
+    Returns:
+        (updated_count, failed_count)
+    """
+    updated_count = 0
+    failed_count = 0
+    next_row = max((entry['row'] for entry in progress.values()), default=-1) + 1
+    
+    workers = workers or os.cpu_count() or 1
+    batches = [work_queue[i:i + batch_size] for i in range(0, len(work_queue), batch_size)]
+    
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_preprocess_worker,
+        initargs=(preprocess,)
+    ) as pool:
+        
+        def submit(batch):
+            return [
+                (slug, poster_file, pool.submit(_preprocess_poster, str(poster_file)))
+                for slug, poster_file in batch
+            ]
+        
+        # Keep one batch in flight ahead of the one being embedded
+        pending = submit(batches[0])
+        
+        # Use tqdm for a nice progress bar
+        with tqdm(total=len(work_queue), desc="Processing posters", unit="poster") as bar, \
+                open(EMBEDDINGS_LOG, 'ab') as emb_log:
+            for batch_idx in range(len(batches)):
+                current = pending
+                if batch_idx + 1 < len(batches):
+                    pending = submit(batches[batch_idx + 1])
+                
+                # Collect preprocessed tensors (skip posters that failed to decode)
+                slugs = []
+                tensors = []
+                for slug, poster_file, future in current:
+                    try:
+                        tensors.append(future.result())
+                        slugs.append(slug)
+                    except Exception as e:
+                        tqdm.write(f"   ❌ Failed to process {poster_file.name}: {e}")
+                        failed_count += 1
+                
+                if tensors:
+                    try:
+                        # Generate embeddings (the magic happens here!)
+                        # One CLIP forward pass: N images → N × 512 numbers
+                        embeddings = await generate_embeddings_batch(tensors)
+                        
+                        # Append-only checkpoint (in case of interruption)
+                        emb_log.write(embeddings.astype(np.float32).tobytes())
+                        emb_log.flush()
+                        
+                        generated_at = datetime.now(timezone.utc).isoformat()
+                        for slug in slugs:
+                            progress[slug] = {'row': next_row, 'generated_at': generated_at}
+                            next_row += 1
+                        _save_progress(progress)
+                        
+                        updated_count += len(slugs)
+                        
+                    except Exception as e:
+                        tqdm.write(f"   ❌ Failed to embed batch of {len(slugs)} posters: {e}")
+                        failed_count += len(slugs)
+                
+                bar.update(len(current))
+    
+    return updated_count, failed_count
+
+
 def main():
     """Parse arguments and run embedding generation"""
     parser = argparse.ArgumentParser(
@@ -192,11 +351,27 @@ def main():
         action='store_true',
         help='Regenerate all embeddings, even if they already exist'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of image preprocessing processes (default: CPU count)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=32,
+        help='Number of posters per CLIP forward pass (default: 32)'
+    )
     
     args = parser.parse_args()
     
     # Run async function
-    asyncio.run(build_embeddings(force_regenerate=args.force))
+    asyncio.run(build_embeddings(
+        force_regenerate=args.force,
+        workers=args.workers,
+        batch_size=args.batch_size
+    ))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+"""
+Build IVF-PQ Index Script
+=========================
+Creates a compressed FAISS IndexIVFPQ from the embeddings in posters.json,
+saved alongside the exact Flat index.
+
+Process:
+1. Loads embeddings from posters.json
+2. Trains IVF clusters + product quantizer on the full matrix
+3. Saves index to data/index.pq.faiss
+4. Saves ID mapping to data/index.pq.mapping.json
+
+Why IVF-PQ?
+- Each vector is stored as 32 one-byte codes (16x smaller than FP32)
+- Queries score codes with small lookup tables instead of float dot
+  products, and only scan the `nprobe` closest clusters
+- Approximate: expect ≥95% recall@1 with nprobe=8
+
+Only worthwhile once the catalog reaches ~10K posters; at a few hundred
+the Flat index is smaller in absolute terms and exact.
+
+Usage:
+    python backend/scripts/build_ivfpq_index.py
+    python backend/scripts/build_ivfpq_index.py --nlist 256 --nprobe 16
+
+Serving:
+    VectorStore(index_path="data/index.faiss", ..., index_kind='ivfpq')
+
+Requirements:
+- Run build_embeddings.py first to generate embeddings
+- At least 256 embeddings (PQ codebook training)
+"""
+
+import argparse
+import faiss
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from rag.vector_store import VectorStore, INDEX_KINDS, IVFPQ_MIN_TRAINING_VECTORS
+from utils.json_io import load_json
+
+# FAISS wants ~39 training points per cluster for stable k-means
+MIN_POINTS_PER_CLUSTER = 39
+
+
+def build_ivfpq_index(nlist: int = 64, nprobe: int = 8):
+    """
+    Build an IVF-PQ index from embeddings in metadata.
+    
+    Args:
+        nlist: Requested number of IVF clusters (clamped to the data size)
+        nprobe: Clusters visited per query during the recall check
+    """
+    
+    print("\n" + "="*60)
+    print("FAISS IVF-PQ INDEX BUILDER")
+    print("="*60)
+    
+    # Paths
+    metadata_path = Path("data/posters.json")
+    index_path = Path("data/index.faiss")
+    
+    # Validate metadata exists
+    if not metadata_path.exists():
+        print(f"❌ Error: Metadata file not found: {metadata_path}")
+        print("   Run build_embeddings.py first to generate embeddings")
+        return
+    
+    # Load metadata
+    print(f"\n📂 Loading metadata from {metadata_path}...")
+    metadata = load_json(metadata_path)
+    
+    sorted_slugs = sorted(
+        slug for slug, data in metadata.items()
+        if data.get('embedding') is not None
+    )
+    count = len(sorted_slugs)
+    print(f"   ✅ Found {count} entries with embeddings")
+    
+    if count < IVFPQ_MIN_TRAINING_VECTORS:
+        print(
+            f"❌ Error: IVF-PQ needs at least {IVFPQ_MIN_TRAINING_VECTORS} vectors "
+            f"to train, found {count}"
+        )
+        print("   Use build_faiss_index.py (exact Flat index) at this scale")
+        return
+    
+    # Stack embeddings into a single (N, d) matrix in mapping order
+    matrix = np.asarray(
+        [metadata[slug]['embedding'] for slug in sorted_slugs], dtype='float32'
+    )
+    faiss.normalize_L2(matrix)
+    embedding_dim = matrix.shape[1]
+    
+    # Too many clusters for the data leaves most of them empty or untrained
+    effective_nlist = max(1, min(nlist, count // MIN_POINTS_PER_CLUSTER))
+    if effective_nlist != nlist:
+        print(f"   ⚠️ Reducing nlist from {nlist} to {effective_nlist} for {count} vectors")
+    
+    # Rebuild from scratch: a stale index carries old cluster/codebook training
+    pq_path = index_path.with_suffix(INDEX_KINDS['ivfpq'])
+    pq_path.unlink(missing_ok=True)
+    
+    # Initialize vector store
+    print(f"\n🏗️ Creating IVF-PQ index...")
+    store = VectorStore(
+        index_path=str(index_path),
+        metadata_path=str(metadata_path),
+        dimension=embedding_dim,
+        index_kind='ivfpq',
+        nlist=effective_nlist,
+        nprobe=nprobe
+    )
+    
+    print(f"   Clusters (nlist): {effective_nlist}")
+    print(f"   Probed per query (nprobe): {nprobe}")
+    
+    # Train on the full matrix and add in one FAISS call
+    print(f"\n🧠 Training and adding {count} vectors...")
+    store.add_embeddings(sorted_slugs, matrix)
+    
+    # Save index
+    print("\n💾 Saving IVF-PQ index...")
+    store.save()
+    
+    flat_size = index_path.stat().st_size if index_path.exists() else 0
+    pq_size = pq_path.stat().st_size
+    
+    # Recall@1 against exact search: each vector should find itself
+    print("\n🧪 Measuring recall@1...")
+    _, ids = store.index.search(matrix, 1)
+    recall = float(np.mean(ids[:, 0] == np.arange(count)))
+    
+    # Summary
+    print("\n" + "="*60)
+    print("SUMMARY")
+    print("="*60)
+    print(f"✅ IVF-PQ index built successfully!")
+    print(f"   Index: {pq_path} ({pq_size:,} bytes)")
+    if flat_size:
+        print(f"   Flat index: {index_path} ({flat_size:,} bytes, {flat_size / pq_size:.1f}x larger)")
+    print(f"   Recall@1 (self-query, nprobe={nprobe}): {recall:.1%}")
+    
+    if recall < 0.95:
+        print("\n   ⚠️ Recall below 95%: try a higher --nprobe or fewer --nlist")
+
+
+def main():
+    """Parse arguments and build the index"""
+    parser = argparse.ArgumentParser(
+        description="Build a compressed IVF-PQ FAISS index from poster embeddings"
+    )
+    parser.add_argument(
+        '--nlist',
+        type=int,
+        default=64,
+        help='Number of IVF clusters (default: 64, clamped to data size)'
+    )
+    parser.add_argument(
+        '--nprobe',
+        type=int,
+        default=8,
+        help='Clusters searched per query (default: 8)'
+    )
+    
+    args = parser.parse_args()
+    build_ivfpq_index(nlist=args.nlist, nprobe=args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
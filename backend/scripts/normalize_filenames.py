@@ -10,22 +10,64 @@ What it does:
   - Writes canonical metadata to `data/posters.json`
   - Handles edge cases: collisions, unicode, long names, invalid chars
   - If `--apply` is used, performs file moves and writes JSON
+  - With `--append-only`, appends new entries to `posters.jsonl` instead of
+    rewriting `posters.json`; `--compact` folds the log back in
 
 This tool is used for initial ingestion AND future user uploads.
 """
 from __future__ import annotations
 
 import argparse
+import contextlib
+import errno
 import json
+import mmap
+import os
 import re
+import shutil
+import sys
 import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+
+try:
+    import orjson  # C serializer; much faster than json.dump with indent
+except ImportError:  # standalone use without backend requirements installed
+    orjson = None
 
 
 IMAGE_EXT = {".jpg", ".jpeg", ".jfif", ".png", ".webp", ".bmp", ".gif"}
+# Same extensions for str.endswith, most common first
+_IMAGE_EXT_TUP = (".jpg", ".png", ".jpeg", ".webp", ".jfif", ".gif", ".bmp")
 MAX_FILENAME_LENGTH = 200  # reasonable limit to avoid filesystem issues
+LOG_FLUSH_LINES = 256  # apply_moves writes buffered log lines in chunks of this size
+PARALLEL_MIN_FILES = 2000  # below this, process pool startup costs more than it saves
+
+# Precompiled patterns (called once per file; skips re's pattern cache lookup)
+# Season suffix: optional separator + 's' or 'season' + digits at end of stem
+_SEASON_RE = re.compile(r'[\s_-]*((?:season|s)\s*(\d+))\s*$', re.IGNORECASE)
+# Runs of anything outside basic latin lowercase/digits (slug). Underscores
+# are included in the run, so separators and "__" collapse to one "_".
+_NON_SNAKE_RE = re.compile(r"[^a-z0-9]+")
+# Runs of anything outside latin letters (incl. Latin-1/Extended-A accents)
+# and digits, whitespace included, so each run becomes one space (title)
+_NON_TITLE_RE = re.compile(r"[^0-9A-Za-z\u00C0-\u017F]+")
+# Already-canonical slug: lowercase alnum words joined by single underscores
+_CANON_RE = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+
+
+def _nfkc(text: str) -> str:
+    """NFKC-normalize `text`, skipping the codepoint walk when it's a no-op.
+    
+    ASCII is always NFKC-stable, and is_normalized() is the Unicode quick
+    check, so only strings that actually change pay for normalize().
+    """
+    if text.isascii() or unicodedata.is_normalized("NFKC", text):
+        return text
+    return unicodedata.normalize("NFKC", text)
 
 
 def extract_season(stem: str) -> Tuple[str, Optional[int]]:
@@ -45,9 +87,7 @@ def extract_season(stem: str) -> Tuple[str, Optional[int]]:
         'Steins Gate Season 1' -> ('Steins Gate', 1)
         'Naruto' -> ('Naruto', None)
     """
-    # Pattern: optional separator + 's' or 'season' + digits
-    pattern = r'[\s_-]*((?:season|s)\s*(\d+))\s*$'
-    match = re.search(pattern, stem, re.IGNORECASE)
+    match = _SEASON_RE.search(stem)
     
     if match:
         season_num = int(match.group(2))
@@ -79,19 +119,17 @@ def to_snake_case(text: str) -> str:
         return "unknown"
     
     # Unicode normalization
-    s = unicodedata.normalize("NFKC", text)
-    
+    return _snake_from_nfkc(_nfkc(text))
+
+
+def _snake_from_nfkc(s: str) -> str:
+    """to_snake_case() body for text that is already NFKC-normalized."""
     # Convert to lowercase
     s = s.lower()
     
-    # Replace common separators with underscore
-    s = s.replace(" ", "_").replace("-", "_")
-    
-    # Remove non-alphanumeric except underscore (keep basic latin + digits)
-    s = re.sub(r"[^a-z0-9_]+", "_", s)
-    
-    # Collapse multiple underscores
-    s = re.sub(r"_+", "_", s)
+    # Replace separators, other non-alphanumerics and underscore runs with a
+    # single underscore in one pass (keep basic latin + digits)
+    s = _NON_SNAKE_RE.sub("_", s)
     
     # Strip leading/trailing underscores
     s = s.strip("_")
@@ -123,36 +161,74 @@ def normalize_filename(stem: str) -> Tuple[str, str, Optional[int]]:
     # Extract season first
     clean_stem, season = extract_season(stem)
     
+    # Fast path for re-ingesting normalized posters: a canonical slug is
+    # its own snake_case form, and its title is just the words title-cased
+    if len(clean_stem) <= MAX_FILENAME_LENGTH - 10 and _CANON_RE.fullmatch(clean_stem):
+        return clean_stem, clean_stem.replace("_", " ").title(), season
+    
+    # One NFKC pass shared by slug and title
+    normalized = _nfkc(clean_stem)
+    
     # Generate slug (snake_case)
-    slug = to_snake_case(clean_stem)
+    slug = _snake_from_nfkc(normalized) if normalized.strip() else "unknown"
     
-    # Generate human-readable title (Title Case, normalized)
-    title_temp = unicodedata.normalize("NFKC", clean_stem)
-    title_temp = re.sub(r"[^0-9A-Za-z\s\u00C0-\u017F]+", " ", title_temp)
-    title_temp = re.sub(r"\s+", " ", title_temp).strip()
+    # Generate human-readable title (Title Case, accents kept)
+    title_temp = _NON_TITLE_RE.sub(" ", normalized).strip()
     title = title_temp.title() if title_temp else "Unknown"
     
     return slug, title, season
 
 
-def scan_images(folder: Path) -> List[Path]:
+def scan_images(folder: Path) -> List[str]:
+    """Return paths of image files directly inside `folder`, sorted by name.
+    
+    Uses os.scandir so the file-type check comes from the cached directory
+    entry instead of a stat() per file. Paths are returned as the raw
+    DirEntry.path strings; build_mappings works on them with os.path.
+    """
     if not folder.exists():
         raise FileNotFoundError(f"Source folder not found: {folder}")
-    files = [p for p in folder.iterdir() if p.suffix.lower() in IMAGE_EXT and p.is_file()]
-    return sorted(files)
+    with os.scandir(folder) as it:
+        # A bare ".png" is a dotfile with no extension, so exclude exact matches
+        entries = [
+            (e.name, e.path) for e in it
+            if (name_l := e.name.lower()).endswith(_IMAGE_EXT_TUP)
+            and name_l not in IMAGE_EXT
+            and e.is_file(follow_symlinks=False)
+        ]
+    entries.sort()
+    return [path for _, path in entries]
 
 
-def make_unique_filename(dest_dir: Path, slug: str, season: Optional[int], ext: str) -> str:
+def make_unique_filename(
+    existing: Set[str],
+    reserved: Set[str],
+    slug: str,
+    season: Optional[int],
+    ext: str,
+    next_counter: Optional[Dict[str, int]] = None,
+) -> str:
     """Build unique filename from slug + season + extension.
     
     Format: <slug>_s<N>.<ext> if season, else <slug>.<ext>
     If collision, append _1, _2, etc. before extension.
     
+    Collisions are checked against in-memory sets instead of probing the
+    filesystem, and the chosen name is added to `reserved` so later files
+    in the same run can't claim it.
+    
+    `next_counter` remembers, per base filename, the first suffix that
+    might still be free. Since `existing`/`reserved` only grow, earlier
+    suffixes never need re-probing, so N files sharing a slug cost O(N)
+    probes in total instead of O(N²).
+    
     Args:
-        dest_dir: destination directory
+        existing: filenames already present in the destination directory
+        reserved: filenames assigned earlier in this run (updated in place)
         slug: normalized snake_case slug
         season: season number or None
         ext: file extension (e.g., '.png')
+        next_counter: per-run suffix counters (updated in place), optional
     
     Returns:
         Unique filename string
@@ -164,28 +240,44 @@ def make_unique_filename(dest_dir: Path, slug: str, season: Optional[int], ext:
         base = slug
     
     candidate = f"{base}{ext}"
-    counter = 1
     
     # Handle collisions by appending _1, _2, etc.
-    while (dest_dir / candidate).exists():
-        if season is not None:
-            candidate = f"{slug}_s{season}_{counter}{ext}"
-        else:
-            candidate = f"{slug}_{counter}{ext}"
-        counter += 1
+    if candidate in existing or candidate in reserved:
+        key = candidate
+        counter = next_counter.get(key, 1) if next_counter is not None else 1
+        candidate = f"{base}_{counter}{ext}"
         
-        # Safety: prevent infinite loop
-        if counter > 1000:
-            raise RuntimeError(f"Too many collisions for slug: {slug}")
+        while candidate in existing or candidate in reserved:
+            counter += 1
+            
+            # Safety: prevent infinite loop
+            if counter >= 1000:
+                raise RuntimeError(f"Too many collisions for slug: {slug}")
+            
+            candidate = f"{base}_{counter}{ext}"
+        
+        if next_counter is not None:
+            next_counter[key] = counter + 1
     
+    reserved.add(candidate)
     return candidate
 
 
-def build_mappings(files: List[Path], dest_dir: Path, source_type: str = "user") -> List[Dict]:
+def _normalize_one(p_str: str) -> Tuple[str, str, str, str, Optional[int]]:
+    """Normalize one source path (pure function, safe to run in a worker process).
+    
+    Returns:
+        Tuple of (stem, ext, slug, title, season)
+    """
+    stem, ext = os.path.splitext(os.path.basename(p_str))
+    return (stem, ext.lower(), *normalize_filename(stem))
+
+
+def build_mappings(files: List[str], dest_dir: Path, source_type: str = "user") -> List[Dict]:
     """Build mappings from source files to destination normalized files.
     
     Args:
-        files: list of source image paths
+        files: list of source image paths (str, as returned by scan_images)
         dest_dir: destination directory (posters/)
         source_type: 'user' or 'auto' for metadata
     
@@ -197,78 +289,215 @@ def build_mappings(files: List[Path], dest_dir: Path, source_type: str = "user")
         - added_at, source
     """
     mappings = []
-    slug_tracker = {}  # track slug collisions for warning
     
-    for p in files:
-        stem = p.stem
-        ext = p.suffix.lower()
-        
-        # Normalize filename
-        slug, title, season = normalize_filename(stem)
+    # Snapshot destination filenames once; collision checks are set lookups
+    existing = {e.name for e in os.scandir(dest_dir)} if dest_dir.exists() else set()
+    reserved: Set[str] = set()
+    next_counter: Dict[str, int] = {}
+    
+    # One timestamp for the whole batch
+    now_iso = datetime.now(timezone.utc).isoformat()
+    
+    # realpath() per source directory, not per file
+    real_dirs: Dict[str, str] = {}
+    
+    # dest_path prefix, formatted once
+    dest_posix = dest_dir.as_posix()
+    dest_prefix = "" if dest_posix == "." else f"{dest_posix}/"
+    
+    # Normalization (regex + NFKC) is CPU-bound and independent per file, so
+    # large batches fan out to a process pool; collision resolution below
+    # is stateful and stays serial
+    if len(files) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor() as pool:
+            normalized = list(pool.map(_normalize_one, files, chunksize=64))
+    else:
+        normalized = [_normalize_one(p_str) for p_str in files]
+    
+    for p_str, (stem, ext, slug, title, season) in zip(files, normalized):
+        parent, name = os.path.split(p_str)
+        real_dir = real_dirs.get(parent)
+        if real_dir is None:
+            real_dir = real_dirs[parent] = os.path.realpath(parent)
         
         # Build unique destination filename
-        dest_filename = make_unique_filename(dest_dir, slug, season, ext)
-        
-        # Track slug usage for collision detection
-        slug_key = f"{slug}_s{season}" if season else slug
-        if slug_key in slug_tracker:
-            print(f"Warning: Duplicate slug '{slug_key}' for '{p.name}' and '{slug_tracker[slug_key]}'")
-        slug_tracker[slug_key] = p.name
+        dest_filename = make_unique_filename(existing, reserved, slug, season, ext, next_counter)
         
         mappings.append(
             {
-                "original_path": str(p.resolve().as_posix()),
-                "original_name": p.name,
+                "original_path": os.path.join(real_dir, name).replace(os.sep, "/"),
+                "original_name": name,
                 "slug": slug,
                 "title": title,
                 "season": season,
                 "dest_filename": dest_filename,
-                "dest_path": str((dest_dir / dest_filename).as_posix()),
-                "added_at": datetime.now(timezone.utc).isoformat(),
+                "dest_path": f"{dest_prefix}{dest_filename}",
+                "added_at": now_iso,
                 "source": source_type,
                 "ext": ext,
             }
         )
     
+    # Report slug collisions once, after the loop
+    keys = [f"{m['slug']}_s{m['season']}" if m["season"] else m["slug"] for m in mappings]
+    for slug_key, count in Counter(keys).items():
+        if count > 1:
+            names = [m["original_name"] for m, k in zip(mappings, keys) if k == slug_key]
+            print(f"Warning: Duplicate slug '{slug_key}' for {', '.join(repr(n) for n in names)}")
+    
     return mappings
 
 
-def apply_moves(mappings: List[Dict], dest_dir: Path) -> None:
+def apply_moves(mappings: List[Dict], dest_dir: Path, quiet: bool = False) -> None:
     """Move files from source to destination directory.
     
     Args:
         mappings: list of mapping dicts from build_mappings
         dest_dir: destination directory (must exist)
+        quiet: skip per-file "Moved"/"Skipping" lines (errors still shown)
+    
+    Log lines are buffered and written to stdout in chunks instead of one
+    print() (lock + line flush) per file.
     """
     if not dest_dir.exists():
         dest_dir.mkdir(parents=True, exist_ok=True)
         print(f"Created destination directory: {dest_dir}")
     
+    # original_path is already resolved by build_mappings; resolve the
+    # destination once so paths compare as plain strings
+    dest_real = os.path.realpath(dest_dir)
+    
+    log_lines: List[str] = []
+    moved = 0
+    
     for m in mappings:
-        src = Path(m["original_path"])
-        dst = dest_dir / m["dest_filename"]
+        src = m["original_path"]
+        dst = os.path.join(dest_real, m["dest_filename"])
+        name = m["original_name"]
         
         # Skip if source and dest are the same
-        if src.resolve() == dst.resolve():
-            print(f"Skipping (already at destination): {src.name}")
-            continue
+        if os.path.normcase(src) == os.path.normcase(dst):
+            if not quiet:
+                log_lines.append(f"Skipping (already at destination): {name}\n")
         
         # Safety check: destination shouldn't exist (we made it unique)
-        if dst.exists():
-            print(f"Error: Destination exists (skipping): {dst}")
-            continue
+        elif os.path.lexists(dst):
+            log_lines.append(f"Error: Destination exists (skipping): {dst}\n")
         
-        # Safety check: source must exist
-        if not src.exists():
-            print(f"Error: Source file not found (skipping): {src}")
-            continue
+        else:
+            # Move file (a missing source surfaces as FileNotFoundError)
+            try:
+                _move(src, dst)
+                moved += 1
+                if not quiet:
+                    log_lines.append(f"Moved: {name} -> {m['dest_filename']}\n")
+            except FileNotFoundError:
+                log_lines.append(f"Error: Source file not found (skipping): {src}\n")
+            except Exception as e:
+                log_lines.append(f"Error moving {name}: {e}\n")
         
-        # Move file
+        if len(log_lines) >= LOG_FLUSH_LINES:
+            sys.stdout.write("".join(log_lines))
+            log_lines.clear()
+    
+    sys.stdout.write("".join(log_lines))
+    if quiet:
+        sys.stdout.write(f"Moved {moved} file(s)\n")
+    sys.stdout.flush()
+
+
+def _move(src: str, dst: str) -> None:
+    """Rename src to dst, copying across filesystems when rename can't.
+    
+    The cross-device fallback uses shutil.copyfile (sendfile() on Linux,
+    no userspace buffer) and only unlinks the source once the copy is
+    complete; a partial destination is removed if the copy fails.
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
         try:
-            src.rename(dst)
-            print(f"Moved: {src.name} -> {m['dest_filename']}")
+            shutil.copyfile(src, dst)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(dst)
+            raise
+        os.unlink(src)
+
+
+def _posters_key(m: Dict) -> str:
+    """Metadata key for a mapping: slug_sN if season present, else just slug."""
+    if m["season"] is not None:
+        return f"{m['slug']}_s{m['season']}"
+    return m["slug"]
+
+
+def _posters_entry(m: Dict) -> Dict:
+    """Build the posters.json entry for a mapping."""
+    return {
+        "title": m["title"],
+        "slug": m["slug"],
+        "path": f"posters/{m['dest_filename']}",
+        "season": m["season"],
+        "embedding": None,  # populated later by embedder
+        "added_at": m["added_at"],
+        "source": m["source"],
+        "notes": None,
+    }
+
+
+def _load_existing(out_path: Path) -> Dict:
+    """Load existing posters.json for merging (empty dict if missing/unreadable).
+    
+    The file is memory-mapped and parsed straight from the mapped bytes,
+    so no decoded str copy of the whole file is made first.
+    """
+    existing_data = {}
+    if out_path.exists():
+        try:
+            with open(out_path, "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if orjson is not None:
+                    with memoryview(mm) as view:
+                        existing_data = orjson.loads(view)
+                else:
+                    existing_data = json.loads(mm[:])
+            print(f"Loaded {len(existing_data)} existing entries from {out_path}")
         except Exception as e:
-            print(f"Error moving {src.name}: {e}")
+            print(f"Warning: Could not load existing {out_path}: {e}")
+    return existing_data
+
+
+def _write_json_atomic(data: Dict, out_path: Path) -> bool:
+    """Write `data` to `out_path` as indented JSON via temp file + rename.
+    
+    The parent directory must already exist (main() creates it once).
+    Returns True once the rename has published the new file, False if
+    the write failed (out_path is then left untouched).
+    """
+    # Serialize to bytes up front, then one buffered write
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    
+    # Write atomically (write to temp, then rename)
+    temp_path = out_path.with_suffix(".json.tmp")
+    try:
+        with open(temp_path, "wb", buffering=1 << 16) as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())  # contents on disk before the rename publishes them
+        os.replace(temp_path, out_path)
+        print(f"Saved metadata to {out_path} ({len(data)} total entries)")
+        return True
+    except Exception as e:
+        print(f"Error saving {out_path}: {e}")
+        if temp_path.exists():
+            temp_path.unlink()
+        return False
 
 
 def save_posters_json(mappings: List[Dict], out_path: Path) -> None:
@@ -289,53 +518,76 @@ def save_posters_json(mappings: List[Dict], out_path: Path) -> None:
     }
     """
     # Load existing data if file exists (merge mode)
-    existing_data = {}
-    if out_path.exists():
-        try:
-            with out_path.open("r", encoding="utf-8") as f:
-                existing_data = json.load(f)
-            print(f"Loaded {len(existing_data)} existing entries from {out_path}")
-        except Exception as e:
-            print(f"Warning: Could not load existing {out_path}: {e}")
+    existing_data = _load_existing(out_path)
     
     # Build new entries
     for m in mappings:
-        # Use slug_sN as key if season present, else just slug
-        if m["season"] is not None:
-            key = f"{m['slug']}_s{m['season']}"
-        else:
-            key = m["slug"]
+        key = _posters_key(m)
         
         # Skip if already exists (don't overwrite)
         if key in existing_data:
             print(f"Skipping existing entry: {key}")
             continue
         
-        existing_data[key] = {
-            "title": m["title"],
-            "slug": m["slug"],
-            "path": f"posters/{m['dest_filename']}",
-            "season": m["season"],
-            "embedding": None,  # populated later by embedder
-            "added_at": m["added_at"],
-            "source": m["source"],
-            "notes": None,
-        }
-    
-    # Ensure parent directory exists
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+        existing_data[key] = _posters_entry(m)
     
-    # Write atomically (write to temp, then rename)
-    temp_path = out_path.with_suffix(".json.tmp")
-    try:
-        with temp_path.open("w", encoding="utf-8") as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
-        temp_path.replace(out_path)
-        print(f"Saved metadata to {out_path} ({len(existing_data)} total entries)")
-    except Exception as e:
-        print(f"Error saving {out_path}: {e}")
-        if temp_path.exists():
-            temp_path.unlink()
+    _write_json_atomic(existing_data, out_path)
+
+
+def append_posters_jsonl(mappings: List[Dict], out_path: Path) -> None:
+    """Append new entries to the posters.jsonl sidecar next to `out_path`.
+    
+    Costs O(new entries) instead of re-reading and rewriting the whole
+    posters.json. Each line is {"key": ..., "entry": {...}}; duplicates
+    are resolved by compact_posters_jsonl() with the same "existing entry
+    wins" rule as save_posters_json().
+    """
+    jsonl_path = out_path.with_suffix(".jsonl")
+    
+    with open(jsonl_path, "ab", buffering=1 << 16) as f:
+        for m in mappings:
+            record = {"key": _posters_key(m), "entry": _posters_entry(m)}
+            if orjson is not None:
+                f.write(orjson.dumps(record) + b"\n")
+            else:
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+    
+    print(f"Appended {len(mappings)} entries to {jsonl_path}")
+
+
+def compact_posters_jsonl(out_path: Path) -> None:
+    """Fold the posters.jsonl sidecar into canonical posters.json.
+    
+    Entries already in posters.json (or earlier in the log) are kept;
+    later duplicates are skipped. The sidecar is removed once the merged
+    JSON has been written.
+    """
+    jsonl_path = out_path.with_suffix(".jsonl")
+    if not jsonl_path.exists():
+        print(f"Nothing to compact: {jsonl_path} not found")
+        return
+    
+    existing_data = _load_existing(out_path)
+    added = 0
+    
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = orjson.loads(line) if orjson is not None else json.loads(line)
+            key = record["key"]
+            if key in existing_data:
+                print(f"Skipping existing entry: {key}")
+                continue
+            existing_data[key] = record["entry"]
+            added += 1
+    
+    print(f"Compacting {added} new entries from {jsonl_path}")
+    # Only drop the append log once its entries are safely in posters.json
+    if _write_json_atomic(existing_data, out_path):
+        jsonl_path.unlink()
+    else:
+        print(f"Compaction failed, keeping {jsonl_path}")
 
 
 def parse_args() -> argparse.Namespace:
@@ -352,23 +604,43 @@ Examples:
   
   # Process only first 10 files
   python backend/scripts/normalize_filenames.py --source poster_db --dest posters --output data/posters.json --limit 10
+  
+  # Incremental upload: append to data/posters.jsonl instead of rewriting posters.json
+  python backend/scripts/normalize_filenames.py --source uploads --dest posters --output data/posters.json --apply --append-only
+  
+  # Fold data/posters.jsonl into data/posters.json
+  python backend/scripts/normalize_filenames.py --output data/posters.json --compact
         """
     )
-    p.add_argument("--source", required=True, help="Source directory containing original images (e.g., poster_db)")
-    p.add_argument("--dest", required=True, help="Destination directory for normalized images (e.g., posters)")
+    p.add_argument("--source", help="Source directory containing original images (e.g., poster_db)")
+    p.add_argument("--dest", help="Destination directory for normalized images (e.g., posters)")
     p.add_argument("--output", required=True, help="Output JSON metadata file (e.g., data/posters.json)")
     p.add_argument("--apply", action="store_true", help="Apply file moves and write JSON (default: dry-run only)")
     p.add_argument("--limit", type=int, default=0, help="Limit number of files to process (0 = all)")
     p.add_argument("--source-type", choices=["user", "auto"], default="user", help="Source type for metadata")
-    return p.parse_args()
+    p.add_argument("--quiet", action="store_true", help="Don't print a line per moved file")
+    p.add_argument("--append-only", action="store_true", help="Append new entries to <output>.jsonl instead of rewriting the JSON")
+    p.add_argument("--compact", action="store_true", help="Merge <output>.jsonl into the JSON and exit")
+    args = p.parse_args()
+    if not args.compact and (not args.source or not args.dest):
+        p.error("--source and --dest are required unless --compact is used")
+    return args
 
 
 def main() -> None:
     args = parse_args()
     
+    out_json = Path(args.output)
+    
+    # Create the metadata directory once, not on every save
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    
+    if args.compact:
+        compact_posters_jsonl(out_json)
+        return
+    
     src_dir = Path(args.source)
     dest_dir = Path(args.dest)
-    out_json = Path(args.output)
     
     # Scan source directory
     print(f"Scanning {src_dir}...")
@@ -411,10 +683,13 @@ def main() -> None:
         print("⚠️  APPLYING CHANGES (files will be moved)...\n")
         
         # Move files
-        apply_moves(mappings, dest_dir)
+        apply_moves(mappings, dest_dir, quiet=args.quiet)
         
         # Save metadata
-        save_posters_json(mappings, out_json)
+        if args.append_only:
+            append_posters_jsonl(mappings, out_json)
+        else:
+            save_posters_json(mappings, out_json)
         
         print(f"\n✅ Done! Files moved to {dest_dir} and metadata saved to {out_json}")
     else:
@@ -422,8 +697,12 @@ def main() -> None:
         print(f"   Provisional metadata written to {out_json}")
         print(f"   Use --apply to move files and finalize.\n")
         
-        # In dry-run, still write provisional JSON for preview
-        save_posters_json(mappings, out_json)
+        # In dry-run, still write provisional JSON for preview. The append
+        # log is skipped: every preview run would append the same records.
+        if args.append_only:
+            print(f"   (--append-only: {out_json.with_suffix('.jsonl')} not modified in dry-run)")
+        else:
+            save_posters_json(mappings, out_json)
         print(f"\n⚠️  To apply changes, run with --apply flag")
 
 
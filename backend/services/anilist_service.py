@@ -3,8 +3,19 @@ AniList service for fetching anime metadata
 Ported from frontend/services/anilistService.ts
 """
 import logging
-from typing import Dict, Any, List, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
 import httpx
+import orjson
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from utils.cache import async_ttl_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +33,82 @@ HTTPX_TIMEOUT = httpx.Timeout(
     pool=5.0       # 5 seconds to get connection from pool
 )
 
+# Shared client: keeps TCP/TLS connections to AniList alive between calls
+# instead of paying a fresh handshake per request. With HTTP/2, concurrent
+# lookups are multiplexed over a single connection. Created lazily on first
+# use, warmed up and closed by the app's lifespan handler (see main.py).
+_client: Optional[httpx.AsyncClient] = None
+
+# Longest error body excerpt we put in logs/exceptions
+MAX_ERROR_DETAIL_CHARS = 256
+
+# Trending changes slowly and takes no arguments: keep one (timestamp, payload)
+TRENDING_TTL_SECONDS = 300
+_trending_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared AniList client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=HTTPX_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            headers={
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+            }
+        )
+    return _client
+
+
+async def warmup() -> None:
+    """
+    Open the AniList connection ahead of the first user request.
+    
+    Pays the TCP/TLS (and HTTP/2) handshake at startup; failures are only
+    logged, since the first real request will simply connect on its own.
+    """
+    try:
+        await get_client().get(ANILIST_API_URL)
+        logger.info(f"[OK] AniList connection warmed up (HTTP/2: {HTTP2_AVAILABLE})")
+    except httpx.HTTPError as e:
+        logger.warning(f"[WARNING] AniList warmup failed: {e}")
+
+
+async def close_client() -> None:
+    """Close the shared client (call on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _error_details(response: httpx.Response) -> str:
+    """
+    Summarize a non-2xx AniList response, parsing its body at most once.
+    
+    Prefers the GraphQL `errors[].message` list; otherwise falls back to a
+    bounded excerpt of the raw body so huge error pages never reach the logs.
+    """
+    raw = response.content
+    if not raw:
+        return f"Status: {response.status_code}"
+    
+    try:
+        body = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        body = None
+    
+    errors = body.get('errors') if isinstance(body, dict) else None
+    if isinstance(errors, list):
+        messages = ', '.join(e.get('message', '') for e in errors if isinstance(e, dict))
+        if messages:
+            return messages[:MAX_ERROR_DETAIL_CHARS]
+    
+    return raw[:MAX_ERROR_DETAIL_CHARS].decode('utf-8', 'replace')
+
 ANIME_QUERY = """
 query ($search: String) {
   Media (search: $search, type: ANIME) {
@@ -118,39 +205,66 @@ query ($search: String, $page: Int, $perPage: Int) {
 """
 
 
+def _body_prefix(query: str) -> bytes:
+    """
+    Pre-serialize a GraphQL query into the start of a request body.
+    
+    The queries never change, so they are JSON-escaped once at import;
+    each request only serializes its (small) variables dict:
+    prefix + orjson.dumps(variables) + b'}'
+    """
+    return orjson.dumps({'query': query})[:-1] + b',"variables":'
+
+
+_ANIME_BODY_PREFIX = _body_prefix(ANIME_QUERY)
+_SEARCH_BODY_PREFIX = _body_prefix(SEARCH_QUERY)
+_TRENDING_BODY = orjson.dumps({'query': TRENDING_QUERY})
+
+
 async def fetch_trending_anime() -> List[Dict[str, Any]]:
     """
     Fetches trending anime from AniList.
     
+    Successful responses are reused for TRENDING_TTL_SECONDS.
+    
     Returns:
         List of anime info dictionaries
     """
+    global _trending_cache
+    if _trending_cache is not None and time.monotonic() - _trending_cache[0] < TRENDING_TTL_SECONDS:
+        return _trending_cache[1]
+    
     try:
-        async with httpx.AsyncClient(timeout=HTTPX_TIMEOUT) as client:
-            response = await client.post(
-                ANILIST_API_URL,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json',
-                },
-                json={'query': TRENDING_QUERY}
-            )
-            
-            if not response.is_success:
-                raise Exception(f"Failed to fetch trending anime: {response.status_code}")
-            
-            data = response.json()
-            return data.get('data', {}).get('Page', {}).get('media', [])
-            
+        client = get_client()
+        response = await client.post(
+            ANILIST_API_URL,
+            content=_TRENDING_BODY
+        )
+        
+        if not response.is_success:
+            raise Exception(f"Failed to fetch trending anime: {response.status_code}")
+        
+        data = orjson.loads(response.content)
+        trending = data.get('data', {}).get('Page', {}).get('media', [])
+        _trending_cache = (time.monotonic(), trending)
+        return trending
+        
     except Exception as e:
         logger.error(f"Anilist Trending Fetch Error: {e}")
         return []
 
 
+@async_ttl_cache(
+    maxsize=512,
+    ttl=600,
+    key=lambda query, page=1, per_page=10: (query.strip().lower(), page, min(per_page, 50))
+)
 async def search_anime(query: str, page: int = 1, per_page: int = 10) -> Dict[str, Any]:
     """
     Search for anime on AniList and return multiple results.
     
+    Results are cached for 10 minutes per (query, page, per_page).
+    
     Args:
         query: Search query string
         page: Page number (default: 1)
@@ -165,50 +279,37 @@ async def search_anime(query: str, page: int = 1, per_page: int = 10) -> Dict[st
         Exception: If API error occurs
     """
     try:
-        async with httpx.AsyncClient(timeout=HTTPX_TIMEOUT) as client:
-            response = await client.post(
-                ANILIST_API_URL,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json',
-                },
-                json={
-                    'query': SEARCH_QUERY,
-                    'variables': {
-                        'search': query,
-                        'page': page,
-                        'perPage': min(per_page, 50)  # Cap at 50 per AniList limits
-                    }
-                }
-            )
-            
-            if not response.is_success:
-                error_details = f"Status: {response.status_code}"
-                try:
-                    error_body = response.json()
-                    if 'errors' in error_body and isinstance(error_body['errors'], list):
-                        error_details = ', '.join([e.get('message', '') for e in error_body['errors']])
-                except Exception:
-                    error_details = response.text if response.text else error_details
-                
-                logger.error(f"Anilist Search API Error: {error_details}")
-                raise Exception(f"Could not search anime database. ({error_details})")
-            
-            data = response.json()
-            
-            if 'errors' in data:
-                logger.warning(f"Anilist API returned errors: {data['errors']}")
-                raise Exception(f'Search failed: {data["errors"]}')
-            
-            if not data.get('data') or not data['data'].get('Page'):
-                return {'pageInfo': {}, 'results': []}
-            
-            page_data = data['data']['Page']
-            return {
-                'pageInfo': page_data.get('pageInfo', {}),
-                'results': page_data.get('media', [])
-            }
+        client = get_client()
+        response = await client.post(
+            ANILIST_API_URL,
+            content=_SEARCH_BODY_PREFIX + orjson.dumps({
+                'search': query,
+                'page': page,
+                'perPage': min(per_page, 50)  # Cap at 50 per AniList limits
+            }) + b'}'
+        )
+        
+        if not response.is_success:
+            error_details = _error_details(response)
             
+            logger.error(f"Anilist Search API Error: {error_details}")
+            raise Exception(f"Could not search anime database. ({error_details})")
+        
+        data = orjson.loads(response.content)
+        
+        if 'errors' in data:
+            logger.warning(f"Anilist API returned errors: {data['errors']}")
+            raise Exception(f'Search failed: {data["errors"]}')
+        
+        if not data.get('data') or not data['data'].get('Page'):
+            return {'pageInfo': {}, 'results': []}
+        
+        page_data = data['data']['Page']
+        return {
+            'pageInfo': page_data.get('pageInfo', {}),
+            'results': page_data.get('media', [])
+        }
+        
     except httpx.RequestError as e:
         logger.error(f"Anilist Search Request Error: {e}")
         raise Exception("Failed to communicate with Anilist.")
@@ -219,10 +320,14 @@ async def search_anime(query: str, page: int = 1, per_page: int = 10) -> Dict[st
         raise Exception("Failed to search Anilist.")
 
 
+@async_ttl_cache(maxsize=1024, ttl=3600, key=lambda title: title.strip().lower())
 async def fetch_anime_info(title: str) -> Dict[str, Any]:
     """
     Fetches anime information from AniList by title.
     
+    Results are cached for an hour per (case-insensitive) title; failed
+    lookups are not cached.
+    
     Args:
         title: The anime title to search for
     
@@ -233,43 +338,30 @@ async def fetch_anime_info(title: str) -> Dict[str, Any]:
         Exception: If anime not found or API error occurs
     """
     try:
-        async with httpx.AsyncClient(timeout=HTTPX_TIMEOUT) as client:
-            response = await client.post(
-                ANILIST_API_URL,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json',
-                },
-                json={
-                    'query': ANIME_QUERY,
-                    'variables': {'search': title}
-                }
-            )
-            
-            if not response.is_success:
-                # Attempt to extract meaningful error message
-                error_details = f"Status: {response.status_code}"
-                try:
-                    error_body = response.json()
-                    if 'errors' in error_body and isinstance(error_body['errors'], list):
-                        error_details = ', '.join([e.get('message', '') for e in error_body['errors']])
-                except Exception:
-                    error_details = response.text if response.text else error_details
-                
-                logger.error(f"Anilist API Error: {error_details}")
-                raise Exception(f"Could not connect to anime database. ({error_details})")
-            
-            data = response.json()
-            
-            if 'errors' in data:
-                logger.warning(f"Anilist API returned errors: {data['errors']}")
-                raise Exception(f'Could not find information for "{title}".')
-            
-            if not data.get('data') or not data['data'].get('Media'):
-                raise Exception(f'No results found for "{title}".')
-            
-            return data['data']['Media']
+        client = get_client()
+        response = await client.post(
+            ANILIST_API_URL,
+            content=_ANIME_BODY_PREFIX + orjson.dumps({'search': title}) + b'}'
+        )
+        
+        if not response.is_success:
+            # Attempt to extract meaningful error message
+            error_details = _error_details(response)
             
+            logger.error(f"Anilist API Error: {error_details}")
+            raise Exception(f"Could not connect to anime database. ({error_details})")
+        
+        data = orjson.loads(response.content)
+        
+        if 'errors' in data:
+            logger.warning(f"Anilist API returned errors: {data['errors']}")
+            raise Exception(f'Could not find information for "{title}".')
+        
+        if not data.get('data') or not data['data'].get('Media'):
+            raise Exception(f'No results found for "{title}".')
+        
+        return data['data']['Media']
+        
     except httpx.RequestError as e:
         logger.error(f"Anilist Request Error: {e}")
         raise Exception("Failed to communicate with Anilist.")
@@ -4,8 +4,26 @@ Ported from frontend/services/animeThemesService.ts
 """
 import logging
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import httpx
+import orjson
+
+from utils.cache import async_ttl_cache
+
+# Prefer aiohttp as the transport under the httpx API: it spends much less
+# event-loop time per request. aiohttp speaks HTTP/1.1 only, so HTTP/2 (via
+# the optional `h2` package) is used only with the plain httpx transport.
+try:
+    from httpx_aiohttp import HttpxAiohttpClient
+    AIOHTTP_TRANSPORT = True
+except ImportError:
+    AIOHTTP_TRANSPORT = False
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = not AIOHTTP_TRANSPORT
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +37,36 @@ HTTPX_TIMEOUT = httpx.Timeout(
     pool=5.0       # 5 seconds to get connection from pool
 )
 
+# Punctuation → space when tokenizing titles
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+# Shared client: reuses keep-alive connections to api.animethemes.moe instead
+# of a fresh TCP/TLS handshake per lookup. Created lazily on first use and
+# closed by the app's lifespan handler (see main.py).
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared AnimeThemes client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        client_cls = HttpxAiohttpClient if AIOHTTP_TRANSPORT else httpx.AsyncClient
+        _client = client_cls(
+            http2=HTTP2_AVAILABLE,
+            timeout=HTTPX_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            headers={'Accept': 'application/json'}
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client (call on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 def normalize_tokens(text: str) -> List[str]:
     """
@@ -30,40 +78,55 @@ def normalize_tokens(text: str) -> List[str]:
     Returns:
         List of normalized tokens
     """
-    # Replace punctuation with space
-    text = re.sub(r'[^\w\s]', ' ', text.lower())
-    # Split and filter empty strings
-    return [t for t in text.split() if t]
+    # Replace punctuation with space, split and filter empty strings
+    return [t for t in _PUNCT_RE.sub(' ', text.lower()).split() if t]
 
 
-def is_title_match(query: str, candidate: str) -> bool:
+def is_title_match_tokens(q_tokens: frozenset, candidate: str) -> bool:
     """
-    Check if two titles are relevant matches based on token overlap.
+    Check a candidate title against an already-tokenized query.
     
     Args:
-        query: The search query
+        q_tokens: Token set of the search query (see normalize_tokens)
         candidate: The candidate title to match against
     
     Returns:
         True if titles match, False otherwise
     """
-    q_tokens = normalize_tokens(query)
-    c_tokens = normalize_tokens(candidate)
+    c_tokens = frozenset(normalize_tokens(candidate))
     
     if not q_tokens or not c_tokens:
         return False
     
-    # Strict check: One set of tokens must be a subset of the other
-    query_in_candidate = all(qt in c_tokens for qt in q_tokens)
-    candidate_in_query = all(ct in q_tokens for ct in c_tokens)
+    # Strict check: One set of tokens must be a subset of the other.
+    # Only the smaller set can be a subset of the larger (equal sizes →
+    # equal sets), so a single C-level subset test decides it.
+    if len(q_tokens) <= len(c_tokens):
+        return q_tokens.issubset(c_tokens)
+    return c_tokens.issubset(q_tokens)
+
+
+def is_title_match(query: str, candidate: str) -> bool:
+    """
+    Check if two titles are relevant matches based on token overlap.
+    
+    Args:
+        query: The search query
+        candidate: The candidate title to match against
     
-    return query_in_candidate or candidate_in_query
+    Returns:
+        True if titles match, False otherwise
+    """
+    return is_title_match_tokens(frozenset(normalize_tokens(query)), candidate)
 
 
 async def fetch_themes_from_api(anime_title: str) -> List[Dict[str, Any]]:
     """
     Fetches theme data from AnimeThemes API.
     
+    Results are cached for an hour per (case-insensitive) title; empty
+    results for 5 minutes. Errors return [] without being cached.
+    
     Args:
         anime_title: The anime title to search for
     
@@ -71,99 +134,103 @@ async def fetch_themes_from_api(anime_title: str) -> List[Dict[str, Any]]:
         List of SeasonCollection dictionaries with openings, endings, and osts
     """
     try:
-        # Request: Search for anime, include themes, songs, artists, videos AND synonyms
-        params = {
-            'q': anime_title,
-            'include': 'animethemes.song.artists,animethemes.animethemeentries.videos,animesynonyms',
-            'limit': '6'
-        }
+        return await _fetch_themes(anime_title)
+    except Exception as e:
+        logger.error(f"AnimeThemes Fetch Error: {e}")
+        return []
+
+
+@async_ttl_cache(
+    maxsize=512,
+    ttl=3600,
+    negative_ttl=300,
+    key=lambda anime_title: anime_title.strip().lower()
+)
+async def _fetch_themes(anime_title: str) -> List[Dict[str, Any]]:
+    """
+    Cached AnimeThemes lookup for fetch_themes_from_api.
+    
+    Raises on HTTP/transport errors (never cached), so only a successful
+    empty response is remembered as "no themes".
+    """
+    # Request: Search for anime, include themes, songs, artists, videos AND synonyms
+    params = {
+        'q': anime_title,
+        'include': 'animethemes.song.artists,animethemes.animethemeentries.videos,animesynonyms',
+        'limit': '6'
+    }
+    
+    client = get_client()
+    response = await client.get(ANIMETHEMES_API_URL, params=params)
+    
+    if response.status_code == 404:
+        return []
+    
+    if not response.is_success:
+        raise Exception(f"AnimeThemes REST API Error: {response.status_code}")
+    
+    data = orjson.loads(response.content)
+    raw_results = data.get('anime', [])
+    
+    # Single pass: filter out unrelated anime that fuzzy search might have
+    # picked up, and map the rest straight to SeasonCollection format
+    # (tokenize the query once, not once per name/synonym)
+    q_tokens = frozenset(normalize_tokens(anime_title))
+    is_match = is_title_match_tokens
+    collections = []
+    append = collections.append
+    
+    for anime in raw_results:
+        anime_get = anime.get
         
-        async with httpx.AsyncClient(timeout=HTTPX_TIMEOUT) as client:
-            response = await client.get(
-                ANIMETHEMES_API_URL,
-                params=params,
-                headers={'Accept': 'application/json'}
-            )
-            
-            if response.status_code == 404:
-                return []
-            
-            if not response.is_success:
-                raise Exception(f"AnimeThemes REST API Error: {response.status_code}")
-            
-            data = response.json()
-            raw_results = data.get('anime', [])
-            
-            # Filter results to remove unrelated anime that fuzzy search might have picked up
-            filtered_results = []
-            for anime in raw_results:
-                # Check main name
-                if is_title_match(anime_title, anime.get('name', '')):
-                    filtered_results.append(anime)
-                    continue
-                
-                # Check synonyms
-                synonyms = anime.get('animesynonyms', [])
-                if any(is_title_match(anime_title, syn.get('text', '')) for syn in synonyms):
-                    filtered_results.append(anime)
+        # Check main name, then synonyms
+        if not (
+            is_match(q_tokens, anime_get('name', ''))
+            or any(is_match(q_tokens, syn.get('text', '')) for syn in anime_get('animesynonyms') or [])
+        ):
+            continue
+        
+        themes = anime_get('animethemes')
+        if not themes:
+            continue
+        
+        openings = []
+        endings = []
+        osts = []
+        # Insert songs (IN) go to the OST list
+        buckets = {'OP': openings, 'ED': endings, 'IN': osts}
+        
+        for theme in themes:
+            theme_get = theme.get
+            bucket = buckets.get(theme_get('type', ''))
+            if bucket is None:
+                continue
             
-            if not filtered_results:
-                return []
+            song = theme_get('song') or {}
+            song_get = song.get
             
-            # Map the results to SeasonCollection format
-            collections = []
-            for anime in filtered_results:
-                openings = []
-                endings = []
-                osts = []
-                
-                themes = anime.get('animethemes', [])
-                if not themes:
-                    continue
-                
-                for theme in themes:
-                    song = theme.get('song', {})
-                    title = song.get('title', 'Unknown Title')
-                    
-                    # Get artist names
-                    artists = song.get('artists', [])
-                    artist = ', '.join([a.get('name', '') for a in artists]) or 'Unknown Artist'
-                    
-                    # Find the best video
-                    entries = theme.get('animethemeentries', [])
-                    video = None
-                    if entries and entries[0].get('videos'):
-                        video = entries[0]['videos'][0]
-                    
-                    # Construct the direct video URL
-                    video_url = f"https://v.animethemes.moe/{video.get('basename')}" if video else None
-                    
-                    song_obj = {
-                        'title': title,
-                        'artist': artist,
-                        'videoUrl': video_url
-                    }
-                    
-                    theme_type = theme.get('type', '')
-                    if theme_type == 'OP':
-                        openings.append(song_obj)
-                    elif theme_type == 'ED':
-                        endings.append(song_obj)
-                    elif theme_type == 'IN':
-                        # Add Insert songs to OST list
-                        osts.append(song_obj)
-                
-                # Only add if we have at least some themes
-                if openings or endings or osts:
-                    collections.append({
-                        'seasonName': anime.get('name', 'Unknown'),
-                        'openings': openings,
-                        'endings': endings,
-                        'osts': osts
-                    })
+            # Get artist names
+            artists = song_get('artists') or []
+            artist = ', '.join(a.get('name', '') for a in artists) or 'Unknown Artist'
             
-            return collections
+            # Find the best video, and construct its direct URL
+            entries = theme_get('animethemeentries')
+            videos = entries[0].get('videos') if entries else None
+            video_url = f"https://v.animethemes.moe/{videos[0].get('basename')}" if videos else None
             
-    except Exception as e:
-        logger.error(f"AnimeThemes Fetch Error: {e}")
-        return []
+            bucket.append({
+                'title': song_get('title', 'Unknown Title'),
+                'artist': artist,
+                'videoUrl': video_url
+            })
+        
+        # Only add if we have at least some themes
+        if openings or endings or osts:
+            append({
+                'seasonName': anime_get('name', 'Unknown'),
+                'openings': openings,
+                'endings': endings,
+                'osts': osts
+            })
+    
+    return collections
@@ -3,14 +3,61 @@ Gemini service for anime poster identification and theme retrieval
 Ported from frontend/services/geminiService.ts
 """
 import os
-import json
+import re
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Dict, Any, List
+from dataclasses import dataclass
+import orjson
+from typing import Optional, Dict, Any, AsyncIterable, AsyncIterator, List
 from google import genai
 from google.genai import types
 
+# Incremental JSON parsing of streamed responses is optional: without ijson
+# the streamed text is buffered and parsed once at the end
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+from utils.cache import async_ttl_cache
+from utils.persistent_cache import cache_call, image_dhash, persistent_cache
+
 logger = logging.getLogger(__name__)
 
+# Persistent (SQLite) cache lifetimes: Gemini answers are slow and metered
+IDENTIFY_CACHE_TTL = 30 * 86400
+THEMES_CACHE_TTL = 7 * 86400
+YOUTUBE_CACHE_TTL = 7 * 86400
+
+# Max differing dHash bits for an upload to count as the same poster. A
+# near hit reuses another upload's identification unverified (see
+# PersistentCache.find_near_image); keep this small.
+NEAR_DUPLICATE_MAX_DISTANCE = 4
+
+# Concurrent YouTube/Gemini lookups per batch (keeps us under API rate limits)
+YOUTUBE_LOOKUP_CONCURRENCY = 10
+
+# An 11-character YouTube video ID
+_YT_ID_RE = re.compile(r'[a-zA-Z0-9_-]{11}')
+
+# Structured-output schemas: Gemini returns exactly these JSON shapes
+IDENTIFICATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string'},
+        'isAnime': {'type': 'boolean'},
+        'confidence': {'type': 'string', 'enum': ['High', 'Medium', 'Low']}
+    },
+    'required': ['title', 'isAnime', 'confidence']
+}
+YOUTUBE_ID_SCHEMA = {
+    'type': 'object',
+    'properties': {'id': {'type': 'string'}},
+    'required': ['id']
+}
+
 # Configure Gemini API Client (lazy)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 _client: Optional[genai.Client] = None
@@ -30,12 +77,14 @@ def get_client() -> genai.Client:
     return _client
 
 
+# Slotted, immutable value types: no per-instance __dict__, and safe to share
+# from the caches. to_dict() produces the camelCase API shape.
+@dataclass(slots=True, frozen=True)
 class IdentificationResult:
     """Result from anime poster identification"""
-    def __init__(self, title: str, is_anime: bool, confidence: str = "Medium"):
-        self.title = title
-        self.is_anime = is_anime
-        self.confidence = confidence
+    title: str
+    is_anime: bool
+    confidence: str = "Medium"
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -45,11 +94,11 @@ class IdentificationResult:
         }
 
 
+@dataclass(slots=True, frozen=True)
 class Song:
     """Song metadata"""
-    def __init__(self, title: str, artist: str):
-        self.title = title
-        self.artist = artist
+    title: str
+    artist: str
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -58,13 +107,13 @@ class Song:
         }
 
 
+@dataclass(slots=True, frozen=True)
 class SeasonCollection:
     """Collection of themes for a season"""
-    def __init__(self, season_name: str, openings: List[Song], endings: List[Song], osts: List[Song]):
-        self.season_name = season_name
-        self.openings = openings
-        self.endings = endings
-        self.osts = osts
+    season_name: str
+    openings: List[Song]
+    endings: List[Song]
+    osts: List[Song]
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -75,16 +124,69 @@ class SeasonCollection:
         }
 
 
-async def identify_anime_from_poster(base64_image: str, mime_type: str) -> IdentificationResult:
+async def iter_streamed_json_array(chunks: AsyncIterable[str]) -> AsyncIterator[Any]:
+    """
+    Yield the elements of a JSON array as its text streams in.
+    
+    Each element is yielded as soon as its closing bracket arrives, so
+    callers can start building objects before generation has finished.
+    
+    Args:
+        chunks: Text fragments of a single JSON array (e.g. streamed
+            Gemini response chunks)
+    """
+    if not HAS_IJSON:
+        text = ''.join([chunk async for chunk in chunks if chunk])
+        for item in orjson.loads(text) if text else []:
+            yield item
+        return
+    
+    items = ijson.sendable_list()
+    parser = ijson.items_coro(items, 'item')
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        parser.send(chunk.encode('utf-8'))
+        for item in items:
+            yield item
+        del items[:]
+    parser.close()
+    for item in items:
+        yield item
+
+
+def seasons_from_dicts(data: List[Dict[str, Any]]) -> List[SeasonCollection]:
+    """Build SeasonCollection objects from seasonName/openings/endings/osts dicts."""
+    seasons = []
+    for season_data in data:
+        openings = [Song(s["title"], s["artist"]) for s in season_data.get("openings", [])]
+        endings = [Song(s["title"], s["artist"]) for s in season_data.get("endings", [])]
+        osts = [Song(s["title"], s["artist"]) for s in season_data.get("osts", [])]
+        
+        seasons.append(SeasonCollection(
+            season_name=season_data.get("seasonName", "General"),
+            openings=openings,
+            endings=endings,
+            osts=osts
+        ))
+    
+    return seasons
+
+
+async def identify_anime_from_poster(image_data: bytes, mime_type: str) -> IdentificationResult:
     """
-    Identifies anime from a base64 encoded image string using Gemini.
+    Identifies anime from raw image bytes using Gemini.
     
     Args:
-        base64_image: Base64 encoded image data (without data:image prefix)
+        image_data: Raw image bytes (as uploaded)
         mime_type: MIME type of the image (e.g., 'image/jpeg')
     
     Returns:
         IdentificationResult with title, is_anime flag, and confidence
+    
+    Results are cached persistently by exact image (SHA-256) and by
+    perceptual hash, so a re-encoded or resized copy of a poster that was
+    already identified skips Gemini too.
     """
     try:
         prompt = """Analyze this image. It is likely an anime poster or screenshot. 
@@ -104,19 +206,38 @@ async def identify_anime_from_poster(base64_image: str, mime_type: str) -> Ident
         
         Return a JSON object with these exact keys: title, isAnime, confidence (High/Medium/Low)."""
         
-        # Create the image part
-        import base64
-        image_data = base64.b64decode(base64_image)
+        # Tier 1: exact image; Tier 2: near-duplicate poster
+        cache_key = f"{hashlib.sha256(image_data).hexdigest()}:{mime_type}"
+        cached = await cache_call('get', 'identify', cache_key)
+        
+        dhash = None
+        if cached is None:
+            try:
+                dhash = await asyncio.to_thread(image_dhash, image_data)
+                cached = await cache_call('find_near_image', dhash, NEAR_DUPLICATE_MAX_DISTANCE)
+            except Exception as e:
+                logger.debug(f"Could not hash image for near-duplicate lookup: {e}")
+        
+        if cached is not None:
+            result = orjson.loads(cached)
+            logger.info(f"Identification cache hit: {result.get('title')}")
+            return IdentificationResult(
+                title=result["title"],
+                is_anime=result["isAnime"],
+                confidence=result["confidence"]
+            )
         
         client = get_client()
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash',
             contents=[
                 prompt,
+                # Raw bytes go straight into the image part (no base64 round-trip)
                 types.Part.from_bytes(data=image_data, mime_type=mime_type)
             ],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
+                response_schema=IDENTIFICATION_SCHEMA,
             )
         )
         
@@ -124,14 +245,21 @@ async def identify_anime_from_poster(base64_image: str, mime_type: str) -> Ident
             raise ValueError("No response from Gemini")
         
         # Parse the JSON response
-        result = json.loads(response.text)
+        result = orjson.loads(response.text)
         
-        return IdentificationResult(
+        identification = IdentificationResult(
             title=result.get("title", "Unknown"),
             is_anime=result.get("isAnime", False),
             confidence=result.get("confidence", "Medium")
         )
         
+        encoded = orjson.dumps(identification.to_dict())
+        await cache_call('set', 'identify', cache_key, encoded, IDENTIFY_CACHE_TTL)
+        if dhash is not None:
+            await cache_call('set_image', dhash, encoded, IDENTIFY_CACHE_TTL)
+        
+        return identification
+        
     except RuntimeError as e:
         logger.warning(f"Gemini unavailable: {e}")
         raise Exception("Gemini is not configured. Please set GEMINI_API_KEY or use RAG-only mode.")
@@ -144,6 +272,9 @@ async def fetch_supplemental_themes(anime_title: str) -> List[SeasonCollection]:
     """
     Fetches supplemental theme data, focusing on Iconic Insert Songs and OSTs.
     
+    Results are cached for a day per (case-insensitive) title; empty
+    results for 5 minutes. Errors return [] without being cached.
+    
     Args:
         anime_title: The name of the anime series
     
@@ -151,56 +282,7 @@ async def fetch_supplemental_themes(anime_title: str) -> List[SeasonCollection]:
         List of SeasonCollection objects with OPs, EDs, and OSTs
     """
     try:
-        prompt = f"""For the anime series "{anime_title}", identify the most iconic "Insert Songs" and "Original Soundtracks (OSTs)" that are emotionally significant or viral.
-        
-        Examples of what we are looking for:
-        - "I Really Want to Stay at Your House" (Cyberpunk: Edgerunners)
-        - "Komm, susser Tod" (End of Evangelion)
-        - "Vogel im Kafig" (Attack on Titan)
-        - "Libera Me From Hell" (Gurren Lagann)
-        
-        Instructions:
-        1. Focus heavily on the 'osts' array. Include vocal insert songs and main themes here.
-        2. Also list the main Openings and Endings if you know them (as a fallback).
-        3. Group by Season/Arc if possible (e.g., "Season 1").
-        
-        Return a JSON array of season objects. Each object must have:
-        - seasonName (string)
-        - openings (array of objects with title and artist)
-        - endings (array of objects with title and artist)
-        - osts (array of objects with title and artist)"""
-        
-        client = get_client()
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-            )
-        )
-        
-        if not response.text:
-            return []
-        
-        # Parse the JSON response
-        data = json.loads(response.text)
-        
-        # Convert to SeasonCollection objects
-        seasons = []
-        for season_data in data:
-            openings = [Song(s["title"], s["artist"]) for s in season_data.get("openings", [])]
-            endings = [Song(s["title"], s["artist"]) for s in season_data.get("endings", [])]
-            osts = [Song(s["title"], s["artist"]) for s in season_data.get("osts", [])]
-            
-            seasons.append(SeasonCollection(
-                season_name=season_data.get("seasonName", "General"),
-                openings=openings,
-                endings=endings,
-                osts=osts
-            ))
-        
-        return seasons
-        
+        return await _fetch_supplemental_themes(anime_title)
     except RuntimeError as e:
         logger.warning(f"Gemini unavailable for supplemental themes: {e}")
         return []
@@ -209,21 +291,77 @@ async def fetch_supplemental_themes(anime_title: str) -> List[SeasonCollection]:
         return []
 
 
-async def find_youtube_video_id(search_query: str) -> Optional[str]:
+@async_ttl_cache(
+    maxsize=512,
+    ttl=86400,
+    negative_ttl=300,
+    key=lambda anime_title: anime_title.strip().lower()
+)
+@persistent_cache(
+    'supplemental_themes',
+    ttl=THEMES_CACHE_TTL,
+    negative_ttl=300,
+    key=lambda anime_title: anime_title.strip().lower(),
+    encode=lambda seasons: [s.to_dict() for s in seasons],
+    decode=seasons_from_dicts
+)
+async def _fetch_supplemental_themes(anime_title: str) -> List[SeasonCollection]:
     """
-    Find YouTube video ID using YouTube API v3 (primary) with Gemini fallback.
+    Cached Gemini lookup for fetch_supplemental_themes.
     
-    Pipeline:
-    1. Try YouTube Data API v3 (fast, reliable, no AI quota)
-    2. If API unavailable/fails → Fall back to Gemini with Google Search
+    Raises on Gemini errors (never cached), so only a successful empty
+    answer is remembered as "no themes".
+    """
+    prompt = f"""For the anime series "{anime_title}", identify the most iconic "Insert Songs" and "Original Soundtracks (OSTs)" that are emotionally significant or viral.
     
-    Args:
-        search_query: The song/anime to search for
+    Examples of what we are looking for:
+    - "I Really Want to Stay at Your House" (Cyberpunk: Edgerunners)
+    - "Komm, susser Tod" (End of Evangelion)
+    - "Vogel im Kafig" (Attack on Titan)
+    - "Libera Me From Hell" (Gurren Lagann)
+    
+    Instructions:
+    1. Focus heavily on the 'osts' array. Include vocal insert songs and main themes here.
+    2. Also list the main Openings and Endings if you know them (as a fallback).
+    3. Group by Season/Arc if possible (e.g., "Season 1").
+    
+    Return a JSON array of season objects. Each object must have:
+    - seasonName (string)
+    - openings (array of objects with title and artist)
+    - endings (array of objects with title and artist)
+    - osts (array of objects with title and artist)"""
+    
+    client = get_client()
+    stream = await client.aio.models.generate_content_stream(
+        model='gemini-2.5-flash',
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+        )
+    )
+    
+    # Parse the JSON array while it streams, converting each season to a
+    # SeasonCollection as soon as it is complete
+    seasons = []
+    chunks = (chunk.text async for chunk in stream)
+    async for season_data in iter_streamed_json_array(chunks):
+        seasons.extend(seasons_from_dicts([season_data]))
+    
+    return seasons
+
+
+def _youtube_query_key(search_query: str) -> str:
+    """Cache key for a YouTube query: lowercase, collapsed whitespace."""
+    return ' '.join(search_query.lower().split())
+
+
+async def _search_youtube_api(search_query: str) -> Optional[str]:
+    """
+    Look up a video ID with the YouTube Data API v3 (fast, no AI quota).
     
     Returns:
-        11-character YouTube video ID or None
+        11-character YouTube video ID, or None if unavailable/not found
     """
-    # Step 1: Try YouTube Data API v3 first
     try:
         from services.youtube_service import search_youtube_video_id
         
@@ -241,53 +379,206 @@ async def find_youtube_video_id(search_query: str) -> Optional[str]:
     except Exception as e:
         logger.warning(f"[YouTube Search] YouTube API error: {e}, falling back to Gemini...")
     
-    # Step 2: Fall back to Gemini
+    return None
+
+
+async def find_youtube_video_id(search_query: str) -> Optional[str]:
+    """
+    Find YouTube video ID using YouTube API v3 (primary) with Gemini fallback.
+    
+    Results are cached for a day per normalized query (lowercase, collapsed
+    whitespace); misses for 10 minutes. Gemini errors return None without
+    being cached.
+    
+    Pipeline:
+    1. Try YouTube Data API v3 (fast, reliable, no AI quota)
+    2. If API unavailable/fails → Fall back to Gemini with Google Search
+    
+    Args:
+        search_query: The song/anime to search for
+    
+    Returns:
+        11-character YouTube video ID or None
+    """
     try:
-        logger.info(f"[YouTube Search] Using Gemini fallback for: {search_query}")
-        
-        prompt = f"""Find a valid YouTube video ID for the anime song query: "{search_query}".
+        return await _find_youtube_video_id(search_query)
+    except RuntimeError as e:
+        logger.warning(f"[YouTube Search] Gemini not configured: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"[YouTube Search] Gemini fallback error: {e}")
+        return None
+
+
+@async_ttl_cache(maxsize=2048, ttl=86400, negative_ttl=600, key=_youtube_query_key)
+@persistent_cache('youtube_video_id', ttl=YOUTUBE_CACHE_TTL, negative_ttl=600, key=_youtube_query_key)
+async def _find_youtube_video_id(search_query: str) -> Optional[str]:
+    """
+    Cached lookup for find_youtube_video_id.
+    
+    Raises on Gemini errors (never cached), so a None is only remembered
+    when Gemini actually answered "not found".
+    """
+    # Step 1: Try YouTube Data API v3 first
+    video_id = await _search_youtube_api(search_query)
+    if video_id:
+        return video_id
+    
+    # Step 2: Fall back to Gemini
+    logger.info(f"[YouTube Search] Using Gemini fallback for: {search_query}")
+    
+    prompt = f"""Find a valid YouTube video ID for the anime song query: "{search_query}".
+    
+    CRITICAL INSTRUCTIONS FOR EMBEDDING:
+    The user will watch this video in an embedded iframe on a 3rd party site.
+    
+    1. **AVOID** "Official Music Videos" (MVs) from VEVO or major artist channels. They block embedding (Error 150/153).
+    2. **PRIORITIZE** "Topic" channel uploads (Auto-generated by YouTube) as they are usually embed-friendly.
+    3. **PRIORITIZE** "Lyric Videos" or fan uploads (e.g., from 'AniMuse', 'Crunchyroll', or random fan channels).
+    4. Search specifically for "Topic" or "Audio" versions if an MV exists.
+    
+    Examples of good queries to run internally:
+    - "{search_query} Topic"
+    - "{search_query} Audio"
+    - "{search_query} Lyrics"
+    
+    Return a JSON object whose "id" is the 11-character YouTube video ID,
+    or an empty string if you cannot find one."""
+    
+    client = get_client()
+    response = await client.aio.models.generate_content(
+        model='gemini-2.5-flash',
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=YOUTUBE_ID_SCHEMA,
+        )
+    )
+    
+    if not response.text:
+        raise ValueError("Gemini returned empty response")
+    
+    # Schema-constrained output: just validate the ID's shape
+    video_id = orjson.loads(response.text).get('id') or ''
+    if not _YT_ID_RE.fullmatch(video_id):
+        video_id = None
+    
+    if video_id:
+        logger.info(f"[YouTube Search] ✓ Found via Gemini: {video_id}")
+    else:
+        logger.warning("[YouTube Search] Gemini failed to extract video ID")
+    
+    return video_id
+
+
+async def _gemini_find_video_ids(search_queries: List[str]) -> List[Optional[str]]:
+    """
+    Ask Gemini for the video IDs of several songs in one request.
+    
+    Args:
+        search_queries: Song/anime queries
+    
+    Returns:
+        Video ID (or None) per query, in the same order
+    
+    Raises:
+        ValueError: If the response doesn't have one entry per query
+    """
+    numbered = '\n'.join(f'{i}. "{q}"' for i, q in enumerate(search_queries, 1))
+    prompt = f"""Find a valid YouTube video ID for each of these {len(search_queries)} anime song queries:
+        {numbered}
         
         CRITICAL INSTRUCTIONS FOR EMBEDDING:
-        The user will watch this video in an embedded iframe on a 3rd party site.
+        The user will watch these videos in an embedded iframe on a 3rd party site.
         
         1. **AVOID** "Official Music Videos" (MVs) from VEVO or major artist channels. They block embedding (Error 150/153).
         2. **PRIORITIZE** "Topic" channel uploads (Auto-generated by YouTube) as they are usually embed-friendly.
         3. **PRIORITIZE** "Lyric Videos" or fan uploads (e.g., from 'AniMuse', 'Crunchyroll', or random fan channels).
         4. Search specifically for "Topic" or "Audio" versions if an MV exists.
         
-        Examples of good queries to run internally:
-        - "{search_query} Topic"
-        - "{search_query} Audio"
-        - "{search_query} Lyrics"
-        
-        Extract ONLY the 11-character YouTube video ID. Return ONLY the ID string, no other text."""
-        
-        client = get_client()
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
+        Return a JSON array with exactly {len(search_queries)} strings, one per query in the same order:
+        the 11-character YouTube video ID, or an empty string if you cannot find one."""
+    
+    client = get_client()
+    response = await client.aio.models.generate_content(
+        model='gemini-2.5-flash',
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=list[str],
         )
-        
-        if not response.text:
-            logger.warning("[YouTube Search] Gemini returned empty response")
-            return None
-        
-        # Extract ID using regex
-        import re
-        match = re.search(r'[a-zA-Z0-9_-]{11}', response.text)
-        
-        video_id = match.group(0) if match else None
-        
-        if video_id:
-            logger.info(f"[YouTube Search] ✓ Found via Gemini: {video_id}")
-        else:
-            logger.warning("[YouTube Search] Gemini failed to extract video ID")
-        
-        return video_id
-        
-    except RuntimeError as e:
-        logger.warning(f"[YouTube Search] Gemini not configured: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"[YouTube Search] Gemini fallback error: {e}")
-        return None
+    )
+    
+    ids = orjson.loads(response.text) if response.text else []
+    if not isinstance(ids, list) or len(ids) != len(search_queries):
+        raise ValueError(
+            f"Gemini batch returned {len(ids) if isinstance(ids, list) else 'invalid'} "
+            f"IDs for {len(search_queries)} queries"
+        )
+    
+    return [
+        video_id if isinstance(video_id, str) and _YT_ID_RE.fullmatch(video_id) else None
+        for video_id in ids
+    ]
+
+
+async def find_youtube_video_ids(search_queries: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Resolve many YouTube video IDs with as few Gemini calls as possible.
+    
+    Pipeline:
+    1. Persistent cache (shared with find_youtube_video_id)
+    2. YouTube Data API v3 per query, concurrently (at most
+       YOUTUBE_LOOKUP_CONCURRENCY at a time)
+    3. One batched Gemini call for every query the API missed
+    
+    Args:
+        search_queries: Song/anime queries (duplicates are looked up once)
+    
+    Returns:
+        Dict of query → 11-character video ID (or None if not found)
+    """
+    unique_queries = list(dict.fromkeys(search_queries))
+    results: Dict[str, Optional[str]] = {}
+    
+    # Step 1: Cached answers (including recent misses)
+    for query in unique_queries:
+        cached = await cache_call('get', 'youtube_video_id', _youtube_query_key(query))
+        if cached is not None:
+            results[query] = orjson.loads(cached)
+    pending = [q for q in unique_queries if q not in results]
+    
+    # Step 2: YouTube Data API fast path, concurrently
+    semaphore = asyncio.Semaphore(YOUTUBE_LOOKUP_CONCURRENCY)
+    
+    async def lookup(query: str) -> Optional[str]:
+        async with semaphore:
+            return await _search_youtube_api(query)
+    
+    api_ids = await asyncio.gather(*(lookup(q) for q in pending))
+    results.update(zip(pending, api_ids))
+    misses = [q for q, video_id in zip(pending, api_ids) if not video_id]
+    
+    # Step 3: One Gemini call for all API misses
+    answered = [q for q in pending if results.get(q)]
+    if misses:
+        try:
+            logger.info(f"[YouTube Search] Using batched Gemini fallback for {len(misses)} queries")
+            results.update(zip(misses, await _gemini_find_video_ids(misses)))
+            answered = pending
+        except RuntimeError as e:
+            logger.warning(f"[YouTube Search] Gemini not configured: {e}")
+        except Exception as e:
+            logger.error(f"[YouTube Search] Gemini batch fallback error: {e}")
+    
+    # Share new answers with find_youtube_video_id's persistent cache. If
+    # the Gemini call failed, its queries weren't answered: don't cache
+    # them as misses.
+    for query in answered:
+        video_id = results.get(query)
+        await cache_call(
+            'set', 'youtube_video_id', _youtube_query_key(query), orjson.dumps(video_id),
+            YOUTUBE_CACHE_TTL if video_id else 600
+        )
+    
+    return {query: results.get(query) for query in unique_queries}
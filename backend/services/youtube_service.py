@@ -3,52 +3,393 @@ YouTube Data API v3 service for finding embeddable anime song videos.
 Primary search method with Gemini as fallback.
 """
 import os
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Dict, Any
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple
+import httpx
+import orjson
+
+from utils.cache import async_ttl_cache
+from utils.persistent_cache import cache_call, persistent_cache
+
+# Same transport choice as animethemes_service: aiohttp under the httpx API
+# when available, otherwise plain httpx (HTTP/2 if `h2` is installed)
+try:
+    from httpx_aiohttp import HttpxAiohttpClient
+    AIOHTTP_TRANSPORT = True
+except ImportError:
+    AIOHTTP_TRANSPORT = False
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = not AIOHTTP_TRANSPORT
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
 # YouTube API Configuration
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+YOUTUBE_API_URL = 'https://www.googleapis.com/youtube/v3'
+
+HTTPX_TIMEOUT = httpx.Timeout(
+    connect=5.0,
+    read=10.0,
+    write=5.0,
+    pool=5.0
+)
+
+# Shared async HTTP client for the REST API (lazy initialization). Replaces
+# googleapiclient, whose .execute() blocked the event loop for the whole
+# round trip. Closed by the app's lifespan handler (see main.py).
+_youtube_client: Optional[httpx.AsyncClient] = None
+
+# Searches cost ~100 quota units each: keep resolved IDs for a week and
+# retry misses after an hour
+SEARCH_CACHE_TTL = 7 * 86400
+SEARCH_MISS_CACHE_TTL = 3600
+
+# Transient failures (rate limiting, server errors) are retried with jittered
+# exponential backoff. Daily quota exhaustion (403 quotaExceeded) is not:
+# it only resets at midnight Pacific time.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 16.0
+
+# Client-side pacing: at most 5 requests in flight, started >=150ms apart
+MAX_CONCURRENT_REQUESTS = 5
+MIN_REQUEST_INTERVAL = 0.15
+_request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+_pacing_lock = asyncio.Lock()
+_last_request_at = 0.0
 
-# Initialize YouTube API client (lazy initialization)
-_youtube_client = None
+# Daily quota budget. Quota resets at midnight Pacific time; a fixed UTC-8
+# offset is close enough for budgeting. Once the budget is spent, searches
+# return None straight away so callers fall back to Gemini.
+DAILY_QUOTA = 10_000
+DAILY_QUOTA_BUDGET = int(os.getenv("YOUTUBE_DAILY_QUOTA_BUDGET", "8000"))
+QUOTA_COST = {'search': 100, 'videos': 1}
+_QUOTA_TZ = timezone(timedelta(hours=-8))
+_quota_day: Optional[str] = None
+_quota_used = 0
+# Serializes the once-a-day reload so concurrent callers can't each read
+# the stored count and overwrite units already reserved by the others
+_quota_lock = asyncio.Lock()
 
+# Query variants and prior (hits, misses) pseudo-counts. Variants are
+# ordered per search by Thompson sampling over observed success rates, so
+# the variant that usually finds a video is tried first and the others
+# still get explored. The priors keep Topic first and plain second until
+# real data says otherwise: Audio/Lyrics rarely beat plain for anime songs.
+QUERY_VARIANTS = {
+    'topic': "{} Topic",
+    'plain': "{}",
+    'audio': "{} Audio",
+    'lyrics': "{} Lyrics",
+}
+VARIANT_PRIORS = {
+    'topic': (8, 2),
+    'plain': (5, 5),
+    'audio': (2, 8),
+    'lyrics': (2, 8),
+}
+STATS_NAMESPACE = 'youtube_stats'
+STATS_TTL = 365 * 86400
+_variant_stats: Optional[Dict[str, List[int]]] = None
 
-def get_youtube_client():
-    """Get or create YouTube API client."""
+# videos.list accepts up to 50 comma-joined IDs per call (1 quota unit)
+VIDEOS_PER_REQUEST = 50
+VIDEO_DETAILS_FIELDS = (
+    'items(id,snippet(title,channelTitle),contentDetails(duration),status(embeddable))'
+)
+
+
+def _search_cache_key(search_query: str, max_results: int = 5, aggressive: bool = False) -> str:
+    """
+    Cache key for a search: SHA-1 of the normalized query + result count.
+    
+    `aggressive` only changes how the variants are fetched, not the
+    result, so it is not part of the key.
+    """
+    digest = hashlib.sha1(search_query.lower().strip().encode('utf-8')).hexdigest()
+    return f"{digest}:{max_results}"
+
+
+def get_youtube_client() -> Optional[httpx.AsyncClient]:
+    """Get or create the YouTube API client (None if no API key is set)."""
     global _youtube_client
     
-    if _youtube_client is None:
-        if not YOUTUBE_API_KEY:
-            logger.warning("YOUTUBE_API_KEY not found - YouTube API search disabled")
-            return None
+    if not YOUTUBE_API_KEY:
+        logger.warning("YOUTUBE_API_KEY not found - YouTube API search disabled")
+        return None
+    
+    if _youtube_client is None or _youtube_client.is_closed:
+        client_cls = HttpxAiohttpClient if AIOHTTP_TRANSPORT else httpx.AsyncClient
+        _youtube_client = client_cls(
+            base_url=YOUTUBE_API_URL,
+            http2=HTTP2_AVAILABLE,
+            timeout=HTTPX_TIMEOUT,
+            params={'key': YOUTUBE_API_KEY},
+            headers={'Accept': 'application/json'}
+        )
+        logger.info("YouTube API client initialized successfully")
+    
+    return _youtube_client
+
+
+async def close_client() -> None:
+    """Close the shared client (call on application shutdown)."""
+    global _youtube_client
+    if _youtube_client is not None:
+        await _youtube_client.aclose()
+        _youtube_client = None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """True for rate-limit / server errors worth retrying."""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    
+    response = error.response
+    if response.status_code in RETRY_STATUSES:
+        return True
+    if response.status_code == 403:
+        try:
+            errors = orjson.loads(response.content)['error']['errors']
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            return False
+        return any(err.get('reason') in RETRY_REASONS for err in errors)
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before the next attempt: Retry-After, else backoff."""
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(BACKOFF_CAP, float(retry_after))
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, 0.25)
+
+
+class YouTubeSearchUnavailable(Exception):
+    """The API can't be searched right now (no API key, quota budget spent)."""
+
+
+async def _paced_get(client: httpx.AsyncClient, resource: str, params: Dict[str, Any]) -> httpx.Response:
+    """
+    Send one GET under the concurrency cap and minimum request spacing.
+    
+    Raises:
+        YouTubeSearchUnavailable: The request would exceed the daily budget
+    """
+    global _last_request_at
+    
+    await _spend_quota(QUOTA_COST.get(resource, 1))
+    
+    async with _request_semaphore:
+        async with _pacing_lock:
+            wait = _last_request_at + MIN_REQUEST_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            _last_request_at = time.monotonic()
         
+        response = await client.get(f'/{resource}', params=params)
+        response.raise_for_status()
+        return response
+
+
+def _quota_today() -> str:
+    """Current quota day (Pacific time) as YYYY-MM-DD."""
+    return datetime.now(_QUOTA_TZ).strftime('%Y-%m-%d')
+
+
+async def _load_quota_used() -> int:
+    """Quota units spent today, loaded from the persistent cache once a day."""
+    global _quota_day, _quota_used
+    
+    today = _quota_today()
+    if _quota_day != today:
+        async with _quota_lock:
+            if _quota_day != today:
+                raw = await cache_call('get', STATS_NAMESPACE, f'quota:{today}')
+                _quota_day = today
+                _quota_used = orjson.loads(raw) if raw is not None else 0
+    return _quota_used
+
+
+async def _spend_quota(units: int):
+    """
+    Reserve quota for one API call, checked against the daily budget.
+    
+    Called before every request (including retries and each variant of a
+    multi-search lookup), so a lookup can't overshoot the budget.
+    
+    Raises:
+        YouTubeSearchUnavailable: The call would exceed DAILY_QUOTA_BUDGET
+    """
+    global _quota_used
+    
+    await _load_quota_used()
+    if _quota_used + units > DAILY_QUOTA_BUDGET:
+        raise YouTubeSearchUnavailable(
+            f"quota budget spent ({_quota_used}/{DAILY_QUOTA} units today)"
+        )
+    _quota_used += units
+    await cache_call(
+        'set', STATS_NAMESPACE, f'quota:{_quota_day}', orjson.dumps(_quota_used), 2 * 86400
+    )
+
+
+async def _api_get(client: httpx.AsyncClient, resource: str, **params) -> Dict[str, Any]:
+    """
+    GET a YouTube Data API resource and decode the JSON body.
+    
+    Rate-limit and server errors are retried up to MAX_ATTEMPTS times.
+    
+    Raises:
+        httpx.HTTPStatusError: On a non-2xx response (after retries)
+        httpx.TransportError: On connection failures (after retries)
+    """
+    for attempt in range(MAX_ATTEMPTS):
         try:
-            _youtube_client = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-            logger.info("YouTube API client initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize YouTube API client: {e}")
-            return None
+            response = await _paced_get(client, resource, params)
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
+            if attempt + 1 == MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning(
+                f"[WARNING] YouTube API {resource} failed ({e}), "
+                f"retrying in {delay:.1f}s ({attempt + 1}/{MAX_ATTEMPTS})"
+            )
+            await asyncio.sleep(delay)
+
+
+async def _search_variant(
+    client: httpx.AsyncClient,
+    query_variant: str,
+    max_results: int
+) -> List[Dict[str, Any]]:
+    """Run one search.list call and return its items."""
+    logger.info("Searching YouTube API: '%s'", query_variant)
     
-    return _youtube_client
+    search_response = await _api_get(
+        client,
+        'search',
+        q=query_variant,
+        part='id,snippet',
+        type='video',
+        videoEmbeddable='true',  # Only embeddable videos
+        maxResults=max_results,
+        fields='items(id/videoId,snippet/channelTitle)'
+    )
+    
+    items = search_response.get('items', [])
+    if not items:
+        logger.info("No results for '%s'", query_variant)
+    return items
 
 
-async def search_youtube_video_id(search_query: str, max_results: int = 5) -> Optional[str]:
+async def _load_variant_stats() -> Dict[str, List[int]]:
+    """Per-variant [hits, attempts], loaded from the persistent cache once."""
+    global _variant_stats
+    
+    if _variant_stats is None:
+        raw = await cache_call('get', STATS_NAMESPACE, 'variants')
+        stored = orjson.loads(raw) if raw is not None else {}
+        _variant_stats = {
+            name: list(stored.get(name, (0, 0))) for name in QUERY_VARIANTS
+        }
+    return _variant_stats
+
+
+async def _record_variant_results(results: List[Tuple[str, bool]]):
+    """Update variant stats with (variant, found_video) pairs and persist them."""
+    stats = await _load_variant_stats()
+    for name, found in results:
+        stats[name][0] += found
+        stats[name][1] += 1
+    await cache_call('set', STATS_NAMESPACE, 'variants', orjson.dumps(stats), STATS_TTL)
+
+
+def _order_variants(stats: Dict[str, List[int]]) -> List[str]:
+    """Order variant names by a Beta posterior sample of their success rate."""
+    def sample(name: str) -> float:
+        hits, attempts = stats[name]
+        prior_hits, prior_misses = VARIANT_PRIORS[name]
+        return random.betavariate(hits + prior_hits, attempts - hits + prior_misses)
+    
+    return sorted(QUERY_VARIANTS, key=sample, reverse=True)
+
+
+def _pick_video(items: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Pick the first Topic-channel or non-VEVO video from search results.
+    
+    Returns:
+        Video ID, or None if there are no results or all are from VEVO
+    """
+    # Per-result logging uses lazy %-formatting (and one level check for
+    # the loop) so nothing is formatted when INFO is disabled
+    log_results = logger.isEnabledFor(logging.INFO)
+    
+    for item in items:
+        video_id = item['id']['videoId']
+        channel_title = item['snippet']['channelTitle']
+        
+        if log_results:
+            logger.info("  Found: %s | ID: %s", channel_title, video_id)
+        
+        # Prioritize Topic channels, avoid VEVO
+        if 'Topic' in channel_title:
+            logger.info("✓ Selected Topic channel video: %s", video_id)
+            return video_id
+        elif 'VEVO' not in channel_title.upper():
+            # Return first non-VEVO video as fallback
+            logger.info("✓ Selected embeddable video: %s", video_id)
+            return video_id
+    
+    if items:
+        logger.info("Found videos but all from VEVO")
+    return None
+
+
+async def search_youtube_video_id(
+    search_query: str,
+    max_results: int = 5,
+    aggressive: bool = False
+) -> Optional[str]:
     """
     Search for embeddable YouTube video using YouTube Data API v3.
     
+    The resolved ID (after trying every query variant) is cached in process
+    and on disk for 7 days per normalized query; "no embeddable video"
+    for an hour, so repeat lookups spend no quota. Failures (no API key,
+    quota budget spent, HTTP errors) are never cached: they return None
+    for this call only.
+    
     Strategy:
     1. Search with original query + filters for embeddable content
     2. Prioritize "Topic" channels (auto-generated, usually embeddable)
     3. Avoid official MVs from VEVO/major labels (often blocked)
     4. Return first embeddable video ID
     
+    The next query variant is only searched when the previous one returned
+    nothing or only VEVO uploads, so the usual cost is a single search.
+    
     Args:
         search_query: Song/anime search query
         max_results: Number of results to check (default: 5)
+        aggressive: Search all variants concurrently (lower latency on
+            misses, but always spends 4 searches of quota)
     
     Returns:
         11-character YouTube video ID or None if not found
@@ -56,77 +397,95 @@ async def search_youtube_video_id(search_query: str, max_results: int = 5) -> Op
     API Quota Cost: ~100 units per call (search = 100 units)
     Daily Quota: 10,000 units (≈100 searches/day)
     """
-    client = get_youtube_client()
-    
-    if client is None:
-        logger.warning("YouTube API client not available")
-        return None
-    
     try:
-        # Strategy 1: Try with "Topic" suffix (auto-generated channels)
-        queries_to_try = [
-            f"{search_query} Topic",
-            f"{search_query} Audio",
-            f"{search_query} Lyrics",
-            search_query  # Fallback to original
-        ]
-        
-        for query_variant in queries_to_try:
-            logger.info(f"Searching YouTube API: '{query_variant}'")
-            
-            # Search for videos
-            search_response = client.search().list(
-                q=query_variant,
-                part='id,snippet',
-                type='video',
-                videoEmbeddable='true',  # Only embeddable videos
-                maxResults=max_results,
-                fields='items(id(videoId),snippet(title,channelTitle))'
-            ).execute()
-            
-            items = search_response.get('items', [])
-            
-            if not items:
-                logger.info(f"No results for '{query_variant}', trying next variant...")
-                continue
-            
-            # Prioritize results from "Topic" channels or avoiding VEVO
-            for item in items:
-                video_id = item['id']['videoId']
-                channel_title = item['snippet']['channelTitle']
-                video_title = item['snippet']['title']
-                
-                # Check if it's a good candidate
-                is_topic_channel = 'Topic' in channel_title
-                is_vevo = 'VEVO' in channel_title.upper()
-                
-                logger.info(f"  Found: {video_title} | {channel_title} | ID: {video_id}")
-                
-                # Prioritize Topic channels, avoid VEVO
-                if is_topic_channel:
-                    logger.info(f"✓ Selected Topic channel video: {video_id}")
-                    return video_id
-                elif not is_vevo:
-                    # Return first non-VEVO video as fallback
-                    logger.info(f"✓ Selected embeddable video: {video_id}")
-                    return video_id
-            
-            # If we found results but only VEVO, keep searching other variants
-            if items:
-                logger.info(f"Found videos but all from VEVO, trying next variant...")
-        
-        # If we exhausted all variants, return None
-        logger.warning(f"No suitable embeddable video found for: {search_query}")
+        return await _cached_search(search_query, max_results, aggressive)
+    except YouTubeSearchUnavailable as e:
+        logger.warning(f"[WARNING] YouTube API search skipped: {e}")
         return None
-        
-    except HttpError as e:
-        logger.error(f"YouTube API HTTP Error: {e}")
+    except httpx.HTTPStatusError as e:
+        logger.error(f"YouTube API HTTP Error: {e.response.status_code} {e.response.text[:256]}")
         return None
     except Exception as e:
         logger.error(f"YouTube API Error: {e}")
         return None
 
 
+@async_ttl_cache(
+    maxsize=4096,
+    ttl=SEARCH_CACHE_TTL,
+    negative_ttl=SEARCH_MISS_CACHE_TTL,
+    key=_search_cache_key
+)
+@persistent_cache(
+    'youtube_search',
+    ttl=SEARCH_CACHE_TTL,
+    negative_ttl=SEARCH_MISS_CACHE_TTL,
+    key=_search_cache_key
+)
+async def _cached_search(search_query: str, max_results: int, aggressive: bool) -> Optional[str]:
+    """
+    Run the variant searches for search_youtube_video_id.
+    
+    Returns None only when every variant genuinely found no embeddable
+    video; anything else raises, so the cache decorators (which never
+    cache exceptions) don't remember transient failures as misses.
+    
+    Raises:
+        YouTubeSearchUnavailable: No API key, or the daily budget is spent
+            (checked before every search request)
+        httpx.HTTPError: The API call failed (after retries)
+    """
+    client = get_youtube_client()
+    
+    if client is None:
+        raise YouTubeSearchUnavailable("YouTube API client not available")
+    
+    # Most successful variants first (Topic, i.e. auto-generated
+    # channels, until the stats say otherwise)
+    variants = _order_variants(await _load_variant_stats())
+    queries_to_try = [QUERY_VARIANTS[name].format(search_query) for name in variants]
+    
+    if aggressive:
+        results = await asyncio.gather(*(
+            _search_variant(client, query_variant, max_results)
+            for query_variant in queries_to_try
+        ))
+        picks = [_pick_video(items) for items in results]
+        await _record_variant_results(
+            [(name, pick is not None) for name, pick in zip(variants, picks)]
+        )
+        # Keep variant priority: first variant with a usable result wins
+        video_id = next((pick for pick in picks if pick), None)
+        if video_id:
+            return video_id
+    else:
+        tried = []
+        for name, query_variant in zip(variants, queries_to_try):
+            video_id = _pick_video(
+                await _search_variant(client, query_variant, max_results)
+            )
+            tried.append((name, video_id is not None))
+            if video_id:
+                await _record_variant_results(tried)
+                return video_id
+        await _record_variant_results(tried)
+    
+    # If we exhausted all variants, return None
+    logger.warning(f"No suitable embeddable video found for: {search_query}")
+    return None
+
+
+def _video_details(video: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a videos.list item into the details dict."""
+    return {
+        'id': video['id'],
+        'title': video['snippet']['title'],
+        'channel': video['snippet']['channelTitle'],
+        'duration': video['contentDetails']['duration'],
+        'embeddable': video['status']['embeddable']
+    }
+
+
 async def get_video_details(video_id: str) -> Optional[Dict[str, Any]]:
     """
     Get detailed information about a YouTube video.
@@ -145,25 +504,69 @@ async def get_video_details(video_id: str) -> Optional[Dict[str, Any]]:
         return None
     
     try:
-        response = client.videos().list(
+        response = await _api_get(
+            client,
+            'videos',
             part='snippet,contentDetails,status',
             id=video_id,
-            fields='items(id,snippet(title,channelTitle),contentDetails(duration),status(embeddable))'
-        ).execute()
+            fields=VIDEO_DETAILS_FIELDS
+        )
         
         items = response.get('items', [])
         if not items:
             return None
         
-        video = items[0]
-        return {
-            'id': video['id'],
-            'title': video['snippet']['title'],
-            'channel': video['snippet']['channelTitle'],
-            'duration': video['contentDetails']['duration'],
-            'embeddable': video['status']['embeddable']
-        }
+        return _video_details(items[0])
         
     except Exception as e:
         logger.error(f"Error fetching video details: {e}")
         return None
+
+
+async def get_video_details_batch(video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Get details for many YouTube videos with as few API calls as possible.
+    
+    IDs are sent 50 per videos.list call (comma-joined) and the calls run
+    concurrently, so N videos cost ceil(N/50) round trips instead of N.
+    
+    Args:
+        video_ids: 11-character YouTube video IDs (duplicates are ignored)
+    
+    Returns:
+        Dict of video ID → details (same shape as get_video_details);
+        unknown/private videos and failed chunks are omitted
+    
+    API Quota Cost: ~1 unit per 50 videos
+    """
+    client = get_youtube_client()
+    
+    if client is None:
+        return {}
+    
+    unique_ids = list(dict.fromkeys(video_ids))
+    chunks = [
+        unique_ids[i:i + VIDEOS_PER_REQUEST]
+        for i in range(0, len(unique_ids), VIDEOS_PER_REQUEST)
+    ]
+    
+    responses = await asyncio.gather(*(
+        _api_get(
+            client,
+            'videos',
+            part='snippet,contentDetails,status',
+            id=','.join(chunk),
+            fields=VIDEO_DETAILS_FIELDS
+        )
+        for chunk in chunks
+    ), return_exceptions=True)
+    
+    details = {}
+    for chunk, response in zip(chunks, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error fetching details for {len(chunk)} videos: {response}")
+            continue
+        for video in response.get('items', []):
+            details[video['id']] = _video_details(video)
+    
+    return details
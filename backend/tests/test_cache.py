@@ -0,0 +1,308 @@
+"""
+Test Harness for the Async Caches
+=================================
+Exercises the in-process TTL cache (utils/cache.py) and the SQLite cache
+(utils/persistent_cache.py) that front the AniList, AnimeThemes, Gemini
+and YouTube lookups.
+
+Fake coroutines count their calls, so every check is "did the wrapped
+function run again or not". No network access is needed; the SQLite
+cache lives in a temporary CACHE_DB_PATH removed at exit.
+
+Usage:
+    python backend/tests/test_cache.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Point the persistent cache at a throwaway database before it is imported
+_TMP_DIR = tempfile.TemporaryDirectory(prefix="cache_test_")
+os.environ["CACHE_DB_PATH"] = str(Path(_TMP_DIR.name) / "cache.sqlite3")
+
+from utils import persistent_cache as pc
+from utils.cache import async_ttl_cache
+
+
+class FakeLookup:
+    """Async stand-in for an API call: returns queued results, counts calls."""
+    
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+    
+    async def __call__(self, query: str):
+        self.calls += 1
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _check(condition: bool, message: str) -> bool:
+    """Print a ✅/❌ line for one assertion and return it."""
+    print(f"   {'✅' if condition else '❌'} {message}")
+    return condition
+
+
+async def test_ttl_hits_and_negative_ttl():
+    """Test 1: Hits are cached for ttl, empty results only for negative_ttl"""
+    print("\n" + "="*60)
+    print("TEST 1: TTL and negative_ttl")
+    print("="*60)
+    
+    lookup = FakeLookup(["theme"])
+    cached = async_ttl_cache(ttl=60, negative_ttl=0.05)(lookup)
+    await cached("naruto")
+    await cached("naruto")
+    ok = _check(lookup.calls == 1, "Non-empty result served from cache")
+    
+    for empty in (None, []):
+        lookup = FakeLookup(empty)
+        cached = async_ttl_cache(ttl=60, negative_ttl=0.05)(lookup)
+        await cached("unknown")
+        await cached("unknown")
+        ok &= _check(lookup.calls == 1, f"{empty!r} cached within negative_ttl")
+        await asyncio.sleep(0.1)
+        await cached("unknown")
+        ok &= _check(lookup.calls == 2, f"{empty!r} refetched after negative_ttl")
+    
+    lookup = FakeLookup(["theme"])
+    cached = async_ttl_cache(ttl=0.05, negative_ttl=60)(lookup)
+    await cached("naruto")
+    await asyncio.sleep(0.1)
+    await cached("naruto")
+    ok &= _check(lookup.calls == 2, "Non-empty result refetched after ttl")
+    
+    return ok
+
+
+async def test_exceptions_not_cached():
+    """Test 2: A failed call is retried, never remembered as a miss"""
+    print("\n" + "="*60)
+    print("TEST 2: Exceptions Are Never Cached")
+    print("="*60)
+    
+    lookup = FakeLookup(ConnectionError("timeout"), ["theme"])
+    cached = async_ttl_cache(ttl=60, negative_ttl=60)(lookup)
+    
+    try:
+        await cached("naruto")
+        ok = _check(False, "First call raises")
+    except ConnectionError:
+        ok = _check(True, "First call raises")
+    
+    result = await cached("naruto")
+    ok &= _check(result == ["theme"] and lookup.calls == 2, "Second call runs the lookup again")
+    
+    await cached("naruto")
+    ok &= _check(lookup.calls == 2, "Successful result is then cached")
+    return ok
+
+
+async def test_lru_eviction_and_key():
+    """Test 3: Least recently used entry is evicted first; custom keys share entries"""
+    print("\n" + "="*60)
+    print("TEST 3: LRU Eviction and Key Normalization")
+    print("="*60)
+    
+    seen = []
+    
+    async def lookup(query: str):
+        seen.append(query)
+        return query.upper()
+    
+    cached = async_ttl_cache(maxsize=2, ttl=60)(lookup)
+    await cached("a")
+    await cached("b")
+    await cached("a")  # hit: "a" becomes most recently used
+    await cached("c")  # evicts "b"
+    seen.clear()
+    
+    await cached("a")
+    await cached("c")
+    ok = _check(seen == [], "Recently used entries kept")
+    await cached("b")
+    ok &= _check(seen == ["b"], "Least recently used entry evicted")
+    
+    lookup_calls = FakeLookup(["x"])
+    cached = async_ttl_cache(ttl=60, key=lambda query: query.strip().lower())(lookup_calls)
+    await cached("Naruto ")
+    await cached("naruto")
+    ok &= _check(lookup_calls.calls == 1, "Normalized keys share one entry")
+    
+    cached.cache_clear()
+    await cached("naruto")
+    ok &= _check(lookup_calls.calls == 2, "cache_clear() drops all entries")
+    return ok
+
+
+async def test_persistent_decorator():
+    """Test 4: SQLite cache applies negative_ttl and never stores exceptions"""
+    print("\n" + "="*60)
+    print("TEST 4: persistent_cache Decorator")
+    print("="*60)
+    
+    lookup = FakeLookup(["theme"])
+    cached = pc.persistent_cache('test_hits', ttl=60, key=lambda query: query)(lookup)
+    await cached("naruto")
+    result = await cached("naruto")
+    ok = _check(result == ["theme"] and lookup.calls == 1, "Hit survives the orjson round trip")
+    
+    lookup = FakeLookup(None)
+    cached = pc.persistent_cache(
+        'test_misses', ttl=60, negative_ttl=0.05, key=lambda query: query
+    )(lookup)
+    await cached("unknown")
+    await cached("unknown")
+    ok &= _check(lookup.calls == 1, "Miss cached within negative_ttl")
+    await asyncio.sleep(0.1)
+    await cached("unknown")
+    ok &= _check(lookup.calls == 2, "Miss refetched after negative_ttl")
+    
+    lookup = FakeLookup(ConnectionError("timeout"), None)
+    cached = pc.persistent_cache(
+        'test_errors', ttl=60, negative_ttl=60, key=lambda query: query
+    )(lookup)
+    try:
+        await cached("naruto")
+    except ConnectionError:
+        pass
+    await cached("naruto")
+    ok &= _check(lookup.calls == 2, "Exception not stored as a miss")
+    return ok
+
+
+async def test_near_image_threshold():
+    """Test 5: find_near_image matches within max_distance bits, closest first"""
+    print("\n" + "="*60)
+    print("TEST 5: Near-Duplicate Hash Lookup")
+    print("="*60)
+    
+    cache = pc.PersistentCache(Path(_TMP_DIR.name) / "near.sqlite3")
+    base = 0xF0F0_F0F0_F0F0_F0F0  # top bit set: stored as a negative INTEGER
+    cache.set_image(base, b'"base"', 60)
+    cache.set_image(base ^ 0b1, b'"one_bit"', 60)
+    
+    ok = _check(cache.find_near_image(base, 4) == b'"base"', "Exact hash returns its own value")
+    ok &= _check(cache.find_near_image(base ^ 0b11, 4) == b'"one_bit"', "Closest hash wins")
+    ok &= _check(cache.find_near_image(base ^ 0b1111_0000, 4) == b'"base"', "4 differing bits still match")
+    ok &= _check(cache.find_near_image(base ^ 0b1_1111_0000, 4) is None, "5 differing bits don't match")
+    
+    cache.set_image(0x0F0F_0F0F_0F0F_0F0F, b'"expired"', -1)
+    ok &= _check(cache.find_near_image(0x0F0F_0F0F_0F0F_0F0F, 4) is None, "Expired hash ignored")
+    return ok
+
+
+async def test_prune():
+    """Test 6: prune() drops expired rows and caps the poster hash table"""
+    print("\n" + "="*60)
+    print("TEST 6: Pruning")
+    print("="*60)
+    
+    cache = pc.PersistentCache(Path(_TMP_DIR.name) / "prune.sqlite3")
+    cache.set('ns', 'live', b'1', 60)
+    cache.set('ns', 'expired', b'1', -1)
+    for dhash in range(5):
+        cache.set_image(dhash, b'1', 60 + dhash)  # later hashes expire later
+    
+    max_hashes = pc.MAX_POSTER_HASHES
+    pc.MAX_POSTER_HASHES = 3
+    try:
+        cache.prune()
+    finally:
+        pc.MAX_POSTER_HASHES = max_hashes
+    
+    keys = [row[0] for row in cache._conn.execute("SELECT key FROM cache")]
+    hashes = sorted(row[0] for row in cache._conn.execute("SELECT dhash FROM poster_hashes"))
+    ok = _check(keys == ['live'], "Expired cache row deleted")
+    ok &= _check(hashes == [2, 3, 4], "Only the newest MAX_POSTER_HASHES hashes kept")
+    return ok
+
+
+async def test_cache_call_errors():
+    """Test 7: cache_call turns SQLite errors into misses"""
+    print("\n" + "="*60)
+    print("TEST 7: cache_call Error Handling")
+    print("="*60)
+    
+    broken = pc.PersistentCache(Path(_TMP_DIR.name) / "broken.sqlite3")
+    broken._conn.close()  # every query now raises sqlite3.ProgrammingError
+    
+    shared = pc.get_persistent_cache()
+    pc._cache = broken
+    try:
+        got = await pc.cache_call('get', 'ns', 'key')
+        stored = await pc.cache_call('set', 'ns', 'key', b'1', 60)
+    finally:
+        pc._cache = shared
+    
+    ok = _check(got is None, "Failed get returns None (a miss)")
+    ok &= _check(stored is None, "Failed set doesn't raise")
+    
+    lookup = FakeLookup(["theme"])
+    cached = pc.persistent_cache('test_broken', ttl=60, key=lambda query: query)(lookup)
+    pc._cache = broken
+    try:
+        result = await cached("naruto")
+    finally:
+        pc._cache = shared
+    ok &= _check(result == ["theme"], "Decorated call still returns its result")
+    return ok
+
+
+async def run_all_tests():
+    """Run the cache test suite"""
+    print("\n" + "█"*60)
+    print("  CACHE TEST SUITE")
+    print("█"*60)
+    
+    tests = [
+        ("TTL and negative_ttl", test_ttl_hits_and_negative_ttl),
+        ("Exceptions Not Cached", test_exceptions_not_cached),
+        ("LRU Eviction", test_lru_eviction_and_key),
+        ("persistent_cache Decorator", test_persistent_decorator),
+        ("Near-Duplicate Lookup", test_near_image_threshold),
+        ("Pruning", test_prune),
+        ("cache_call Errors", test_cache_call_errors),
+    ]
+    
+    results = []
+    for test_name, test_func in tests:
+        try:
+            results.append((test_name, await test_func()))
+        except Exception as e:
+            print(f"\n❌ {test_name} crashed: {e}")
+            results.append((test_name, False))
+    
+    # Summary
+    print("\n" + "="*60)
+    print("TEST SUMMARY")
+    print("="*60)
+    
+    for test_name, passed in results:
+        status = "✅ PASS" if passed else "❌ FAIL"
+        print(f"{status} - {test_name}")
+    
+    passed_count = sum(1 for _, p in results if p)
+    total_count = len(results)
+    
+    print(f"\nTotal: {passed_count}/{total_count} tests passed")
+    
+    if passed_count == total_count:
+        print("\n🎉 ALL TESTS PASSED!")
+    else:
+        print("\n⚠️ Some tests failed. Review the output above.")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_all_tests())
+    finally:
+        _TMP_DIR.cleanup()
@@ -18,7 +18,10 @@ from pathlib import Path
 # Add backend to path so we can import our modules
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from rag.clip_embedder import generate_embedding, cosine_similarity, load_clip_model
+from rag.clip_embedder import (
+    generate_embedding, generate_embeddings_batch, cosine_similarity, load_clip_model
+)
+from utils.image_validation import validate_images_batch
 import numpy as np
 
 
@@ -115,10 +118,11 @@ async def test_similarity_different_images():
     print(f"📁 Poster A: {poster1.name}")
     print(f"📁 Poster B: {poster2.name}")
     
-    # Generate embeddings
+    # Generate embeddings (one batched forward pass)
     print("🧠 Generating embeddings...")
-    embedding1 = await generate_embedding(poster1.read_bytes())
-    embedding2 = await generate_embedding(poster2.read_bytes())
+    embedding1, embedding2 = await generate_embeddings_batch(
+        [poster1.read_bytes(), poster2.read_bytes()]
+    )
     
     # Calculate similarity
     similarity = cosine_similarity(embedding1, embedding2)
@@ -149,6 +153,8 @@ async def test_multiple_formats():
     
     results = []
     
+    # Read and validate every available poster up front (one batch)
+    posters = {}
     for ext, filename in formats_to_test.items():
         poster_path = Path(f"data/posters/{filename}")
         
@@ -156,11 +162,36 @@ async def test_multiple_formats():
             print(f"⚠️ Skipping {ext}: {filename} not found")
             continue
         
+        posters[ext] = (filename, poster_path.read_bytes())
+    
+    validations = validate_images_batch([image_bytes for _, image_bytes in posters.values()])
+    
+    # Embed all valid posters in one forward pass; if the batch fails,
+    # embed them one by one below to find the offending format
+    valid = [
+        image_bytes
+        for (_, image_bytes), (is_valid, _, _) in zip(posters.values(), validations)
+        if is_valid
+    ]
+    try:
+        batch_embeddings = iter(await generate_embeddings_batch(valid))
+    except Exception as e:
+        print(f"\n⚠️ Batch embedding failed ({e}), retrying formats individually")
+        batch_embeddings = None
+    
+    for (ext, (filename, image_bytes)), (is_valid, error_msg, _) in zip(posters.items(), validations):
         print(f"\n📁 Testing {ext} format: {filename}")
         
+        if not is_valid:
+            print(f"   ❌ {ext} format failed validation: {error_msg}")
+            results.append(False)
+            continue
+        
         try:
-            image_bytes = poster_path.read_bytes()
-            embedding = await generate_embedding(image_bytes)
+            if batch_embeddings is not None:
+                embedding = next(batch_embeddings)
+            else:
+                embedding = await generate_embedding(image_bytes)
             
             if embedding.shape == (512,):
                 print(f"   ✅ {ext} format works! Embedding shape: {embedding.shape}")
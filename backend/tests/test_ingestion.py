@@ -93,7 +93,8 @@ async def test_ingestion_workflow(poster_path_str: str, anime_title: str):
         anime_title=anime_title,
         source="test_script",
         save_image=True,
-        file_extension=poster_path.suffix
+        file_extension=poster_path.suffix,
+        embedding=embedding  # already computed for the Step 1 search
     )
     
     if not result['success']:
@@ -109,14 +110,19 @@ async def test_ingestion_workflow(poster_path_str: str, anime_title: str):
     # Step 3: Verify it's now in the database
     print(f"\n🔍 Step 3: Verifying poster is now in database...")
     
-    # Reload store to get updated index
+    # Reload from disk so the check covers what ingestion actually saved
+    # (index, mapping and posters.json), not just in-memory state
     store = VectorStore(
         index_path=str(DATA_DIR / "index.faiss"),
         metadata_path=str(DATA_DIR / "posters.json"),
         dimension=512
     )
     
-    print(f"   Reloaded index size: {store.index.ntotal} vectors")
+    print(f"   Updated index size: {store.index.ntotal} vectors")
+    
+    if store.index.ntotal != result['index_size']:
+        print(f"\n   ❌ Error: Reloaded index has {store.index.ntotal} vectors, expected {result['index_size']}")
+        return
     
     # Search again
     results = store.search(embedding, k=1)
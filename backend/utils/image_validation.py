@@ -12,15 +12,38 @@ Security Checks:
 """
 
 from PIL import Image
+import hashlib
 import io
 import logging
-from typing import Tuple
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+# Optional: libjpeg-turbo header parse (JPEG size/colorspace without
+# building a PIL Image). Needs the native libturbojpeg library as well.
+try:
+    from turbojpeg import TurboJPEG, TJCS_GRAY, TJCS_CMYK, TJCS_YCCK
+    _turbojpeg = TurboJPEG()
+    HAS_TURBOJPEG = True
+except (ImportError, OSError, RuntimeError):
+    HAS_TURBOJPEG = False
 
 logger = logging.getLogger(__name__)
 
 # Allowed formats (PIL format names)
 ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
 
+# Passed to Image.open so PIL only tries these decoders instead of probing
+# every registered plugin
+_OPEN_FORMATS = tuple(sorted(ALLOWED_FORMATS))
+
+# Color modes get_safe_image can convert to RGB. Checked from the header,
+# so validation never decodes pixels just to test convertibility.
+COMMON_MODES = {'RGB', 'RGBA', 'L', 'P'}
+SUPPORTED_MODES = COMMON_MODES | {'LA', 'PA', 'CMYK', 'I', 'F'}
+
 # Dimension limits
 MIN_DIMENSION = 50      # Too small = likely garbage or icon
 MAX_DIMENSION = 4096    # Larger than this = excessive memory usage
@@ -29,14 +52,122 @@ MAX_DIMENSION = 4096    # Larger than this = excessive memory usage
 MAGIC_BYTES = {
     'JPEG': [b'\xff\xd8\xff'],
     'PNG': [b'\x89PNG\r\n\x1a\n'],
-    'WEBP': [b'RIFF', b'WEBP']  # WEBP has RIFF header then WEBP marker
+    'WEBP': [b'RIFF']  # RIFF header, then the WEBP marker below
 }
+WEBP_MARKER = b'WEBP'
+
+# MAGIC_BYTES flattened once into (prefix, format) pairs, longest prefix
+# first so the most specific signature wins
+_MAGIC_TABLE = tuple(sorted(
+    ((magic, fmt) for fmt, magic_list in MAGIC_BYTES.items() for magic in magic_list),
+    key=lambda entry: -len(entry[0])
+))
+
+
+def _build_magic_dispatch() -> dict:
+    """Group _MAGIC_TABLE by first byte, keeping longest-first order."""
+    dispatch = {}
+    for prefix, fmt in _MAGIC_TABLE:
+        dispatch.setdefault(prefix[0], []).append((prefix, fmt))
+    return {first: tuple(entries) for first, entries in dispatch.items()}
+
+
+# First byte → candidate (prefix, format) pairs. Every allowed format starts
+# with a different byte, so validation is one dict lookup + one startswith.
+_MAGIC_DISPATCH = _build_magic_dispatch()
+
+# Content-addressed cache of validation results, so re-validating the same
+# bytes (upload → validate → get_safe_image, re-ingesting a poster) skips
+# the PIL header parse. SHA-256 rather than SHA-1: this is a security check
+# and SHA-1 collisions can be crafted.
+VALIDATION_CACHE_SIZE = 256
+_validation_cache: "OrderedDict[bytes, Tuple[bool, str, dict]]" = OrderedDict()
+_validation_cache_lock = threading.Lock()
+
+
+def _content_key(image_data: bytes) -> bytes:
+    """Cache key for image bytes (SHA-256 digest)."""
+    return hashlib.sha256(image_data).digest()
+
+
+def _cached_result(key: bytes) -> Optional[Tuple[bool, str, dict]]:
+    """Return a copy of a cached validation result, or None."""
+    with _validation_cache_lock:
+        result = _validation_cache.get(key)
+        if result is None:
+            return None
+        _validation_cache.move_to_end(key)
+    is_valid, error_msg, metadata = result
+    return is_valid, error_msg, dict(metadata)
+
+
+def _remember(key: bytes, is_valid: bool, error_msg: str, metadata: dict):
+    """Store a validation result, evicting the least recently used entry."""
+    with _validation_cache_lock:
+        _validation_cache[key] = (is_valid, error_msg, dict(metadata))
+        _validation_cache.move_to_end(key)
+        if len(_validation_cache) > VALIDATION_CACHE_SIZE:
+            _validation_cache.popitem(last=False)
 
 
 def validate_image(image_data: bytes) -> Tuple[bool, str, dict]:
     """
     Comprehensive image validation with security checks.
     
+    Args:
+        image_data: Raw image bytes from upload
+    
+    Returns:
+        Tuple of (is_valid, error_message, metadata), see _validate_and_open
+    
+    Results are cached by content hash; repeat calls with the same bytes
+    return the cached result without opening the image.
+    """
+    key = _content_key(image_data)
+    cached = _cached_result(key)
+    if cached is not None:
+        return cached
+    
+    is_valid, error_msg, metadata, img = _validate_and_open(image_data, need_image=False)
+    if img is not None:
+        img.close()
+    _remember(key, is_valid, error_msg, metadata)
+    return is_valid, error_msg, metadata
+
+
+def validate_images_batch(blobs: List[bytes]) -> List[Tuple[bool, str, dict]]:
+    """
+    Validate many images concurrently.
+    
+    Hashing and JPEG/PNG header parsing release the GIL, so a thread pool
+    spreads a batch (e.g. a directory of posters) across cores.
+    
+    Args:
+        blobs: Raw image bytes
+    
+    Returns:
+        validate_image results, in input order
+    """
+    if len(blobs) < 2:
+        return [validate_image(blob) for blob in blobs]
+    
+    workers = min(len(blobs), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(validate_image, blobs))
+
+
+def _validate_and_open(
+    image_data: bytes,
+    need_image: bool = True
+) -> Tuple[bool, str, dict, Optional[Image.Image]]:
+    """
+    Validate an image and return the opened PIL Image on success.
+    
+    Lets get_safe_image reuse the image validation already opened instead
+    of parsing the file a second time. With `need_image=False`, JPEG
+    headers are read with libjpeg-turbo when available and no PIL Image is
+    created (the returned image is None).
+    
     Pipeline:
     1. Magic byte verification (file signature)
     2. PIL format detection
@@ -45,12 +176,14 @@ def validate_image(image_data: bytes) -> Tuple[bool, str, dict]:
     
     Args:
         image_data: Raw image bytes from upload
+        need_image: Whether the caller needs the opened image
     
     Returns:
-        Tuple of (is_valid, error_message, metadata)
+        Tuple of (is_valid, error_message, metadata, image)
         - is_valid: True if all checks pass
         - error_message: Human-readable error (or "OK" if valid)
         - metadata: Dict with format, dimensions, mode
+        - image: The opened PIL Image if valid, else None
     
     Security Note:
         Magic byte check prevents attacks where malicious files are renamed
@@ -66,57 +199,45 @@ def validate_image(image_data: bytes) -> Tuple[bool, str, dict]:
     }
     
     try:
-        # Step 1: Magic byte verification
-        magic_valid = False
-        detected_format = None
-        
-        for fmt, magic_list in MAGIC_BYTES.items():
-            for magic in magic_list:
-                if image_data.startswith(magic):
-                    magic_valid = True
-                    detected_format = fmt
-                    break
-            if magic_valid:
-                break
+        # Step 1: Magic byte verification (dispatch on the first byte)
+        candidates = _MAGIC_DISPATCH.get(image_data[0], ()) if image_data else ()
+        detected_format = next(
+            (fmt for prefix, fmt in candidates if image_data.startswith(prefix)), None
+        )
+        magic_valid = detected_format is not None
         
         # Special case: WEBP needs both RIFF and WEBP markers
-        if detected_format == 'WEBP':
-            if not (image_data.startswith(b'RIFF') and b'WEBP' in image_data[:20]):
-                return False, "Invalid WEBP file signature", metadata
+        if detected_format == 'WEBP' and WEBP_MARKER not in image_data[:20]:
+            return False, "Invalid WEBP file signature", metadata, None
         
         if not magic_valid:
             logger.warning(f"Magic byte check failed. First 20 bytes: {image_data[:20]}")
-            return False, "File format not recognized. Upload a valid JPEG, PNG, or WEBP image.", metadata
+            return False, "File format not recognized. Upload a valid JPEG, PNG, or WEBP image.", metadata, None
         
-        # Step 2: Open with PIL for detailed validation
+        # Step 2 (fast path): JPEG header only, no PIL Image
+        if not need_image and HAS_TURBOJPEG and detected_format == 'JPEG':
+            return _validate_jpeg_header(image_data, metadata)
+        
+        # Step 2: Open with PIL for detailed validation. A fresh BytesIO per
+        # call is deliberate: BytesIO over `bytes` shares the buffer (no
+        # copy), a shared module-level stream would race under
+        # validate_images_batch's threads, and ImageFile.Parser decodes the
+        # whole image as it is fed rather than stopping at the header.
         try:
-            img = Image.open(io.BytesIO(image_data))
+            img = Image.open(io.BytesIO(image_data), formats=_OPEN_FORMATS)
         except Exception as e:
             logger.warning(f"PIL failed to open image: {e}")
-            return False, f"Image file is corrupted or invalid: {str(e)}", metadata
+            return False, f"Image file is corrupted or invalid: {str(e)}", metadata, None
         
-        # Step 3: Format validation
-        if img.format not in ALLOWED_FORMATS:
-            return False, f"Unsupported image format: {img.format}. Only JPEG, PNG, and WEBP are allowed.", metadata
+        # Steps 3-5 only read header fields; close the image (releasing the
+        # decoder and its buffer) as soon as a check fails
+        error_msg = _check_header(img.format, img.size, img.mode)
+        if error_msg:
+            img.close()
+            return False, error_msg, metadata, None
         
-        # Step 4: Dimension validation
         width, height = img.size
         
-        if width < MIN_DIMENSION or height < MIN_DIMENSION:
-            return False, f"Image too small ({width}x{height}). Minimum size is {MIN_DIMENSION}x{MIN_DIMENSION} pixels.", metadata
-        
-        if width > MAX_DIMENSION or height > MAX_DIMENSION:
-            return False, f"Image too large ({width}x{height}). Maximum size is {MAX_DIMENSION}x{MAX_DIMENSION} pixels.", metadata
-        
-        # Step 5: Mode validation (ensure it's a valid color space)
-        if img.mode not in ['RGB', 'RGBA', 'L', 'P']:
-            logger.warning(f"Unusual image mode: {img.mode}")
-            # Try to convert to RGB
-            try:
-                img = img.convert('RGB')
-            except:
-                return False, f"Unsupported color mode: {img.mode}. Cannot process this image.", metadata
-        
         # Populate metadata
         metadata.update({
             'format': img.format,
@@ -125,15 +246,83 @@ def validate_image(image_data: bytes) -> Tuple[bool, str, dict]:
             'mode': img.mode
         })
         
-        logger.debug(f"Image validation passed: {width}x{height} {img.format} {img.mode}")
-        return True, "OK", metadata
+        logger.debug("Image validation passed: %dx%d %s %s", width, height, img.format, img.mode)
+        return True, "OK", metadata, img
         
     except Exception as e:
         logger.error(f"Unexpected validation error: {e}", exc_info=True)
-        return False, f"Failed to validate image: {str(e)}", metadata
+        return False, f"Failed to validate image: {str(e)}", metadata, None
+
+
+def _validate_jpeg_header(image_data: bytes, metadata: dict) -> Tuple[bool, str, dict, None]:
+    """
+    Validate a JPEG from its libjpeg-turbo header (no pixel decode).
+    
+    Returns:
+        Same tuple as _validate_and_open, with image always None
+    """
+    try:
+        width, height, _, colorspace = _turbojpeg.decode_header(image_data)
+    except Exception as e:
+        logger.warning(f"libjpeg-turbo failed to read JPEG header: {e}")
+        return False, f"Image file is corrupted or invalid: {str(e)}", metadata, None
+    
+    # Same mode PIL would report for this colorspace
+    if colorspace == TJCS_GRAY:
+        mode = 'L'
+    elif colorspace in (TJCS_CMYK, TJCS_YCCK):
+        mode = 'CMYK'
+    else:
+        mode = 'RGB'
+    
+    error_msg = _check_header('JPEG', (width, height), mode)
+    if error_msg:
+        return False, error_msg, metadata, None
+    
+    metadata.update({
+        'format': 'JPEG',
+        'width': width,
+        'height': height,
+        'mode': mode
+    })
+    
+    logger.debug("Image validation passed: %dx%d JPEG %s", width, height, mode)
+    return True, "OK", metadata, None
 
 
-def get_safe_image(image_data: bytes) -> Tuple[bool, Image.Image | None, str]:
+def _check_header(fmt: Optional[str], size: Tuple[int, int], mode: str) -> Optional[str]:
+    """
+    Check format, dimensions and color mode read from an image header.
+    
+    Returns:
+        Human-readable error message, or None if the image is acceptable
+    """
+    # Step 3: Format validation
+    if fmt not in ALLOWED_FORMATS:
+        return f"Unsupported image format: {fmt}. Only JPEG, PNG, and WEBP are allowed."
+    
+    # Step 4: Dimension validation
+    width, height = size
+    
+    if width < MIN_DIMENSION or height < MIN_DIMENSION:
+        return f"Image too small ({width}x{height}). Minimum size is {MIN_DIMENSION}x{MIN_DIMENSION} pixels."
+    
+    if width > MAX_DIMENSION or height > MAX_DIMENSION:
+        return f"Image too large ({width}x{height}). Maximum size is {MAX_DIMENSION}x{MAX_DIMENSION} pixels."
+    
+    # Step 5: Mode validation (ensure it's a valid color space)
+    if mode not in COMMON_MODES:
+        logger.warning(f"Unusual image mode: {mode}")
+        if mode not in SUPPORTED_MODES:
+            return f"Unsupported color mode: {mode}. Cannot process this image."
+    
+    return None
+
+
+def get_safe_image(
+    image_data: bytes,
+    min_size: Optional[int] = None
+) -> Tuple[bool, Image.Image | None, str]:
     """
     Validate and return a safe PIL Image object.
     
@@ -142,20 +331,38 @@ def get_safe_image(image_data: bytes) -> Tuple[bool, Image.Image | None, str]:
     
     Args:
         image_data: Raw image bytes
+        min_size: Optional smallest width/height the caller needs. Large
+            JPEGs are then decoded at a reduced scale (1/2, 1/4 or 1/8)
+            that still covers it, e.g. 448 for CLIP's 224x224 input.
     
     Returns:
         Tuple of (success, image_object, error_message)
     """
-    is_valid, error_msg, metadata = validate_image(image_data)
+    # Known-bad bytes are rejected without opening them again
+    key = _content_key(image_data)
+    cached = _cached_result(key)
+    if cached is not None and not cached[0]:
+        return False, None, cached[1]
+    
+    is_valid, error_msg, metadata, img = _validate_and_open(image_data)
+    _remember(key, is_valid, error_msg, metadata)
     
     if not is_valid:
         return False, None, error_msg
     
     try:
-        img = Image.open(io.BytesIO(image_data))
+        if img.format == 'JPEG' and min_size:
+            # Downscale in the DCT (1/2, 1/4 or 1/8) when the caller needs
+            # fewer pixels. Only sets decoder options: pixels are still
+            # decoded lazily, once. draft() never converts L/CMYK sources
+            # to RGB; the convert() below still handles those.
+            img.draft(img.mode, (min_size, min_size))
+        
         # Ensure RGB mode for CLIP
         if img.mode != 'RGB':
-            img = img.convert('RGB')
+            with img:
+                img = img.convert('RGB')
         return True, img, "OK"
     except Exception as e:
+        img.close()
         return False, None, f"Failed to load image: {str(e)}"
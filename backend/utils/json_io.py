@@ -0,0 +1,31 @@
+"""
+JSON I/O Utilities
+==================
+Fast load/dump helpers for the metadata files (posters.json, index mappings).
+
+posters.json stores a 512-float embedding per anime, so it grows to several
+MB. orjson parses and serializes it ~3-10x faster than the stdlib json module
+and serializes numpy arrays natively (no .tolist() round-trip).
+"""
+
+import orjson
+from pathlib import Path
+from typing import Any, Union
+
+PathLike = Union[str, Path]
+
+
+def load_json(path: PathLike) -> Any:
+    """Read and parse a JSON file in a single bytes read."""
+    return orjson.loads(Path(path).read_bytes())
+
+
+def dump_json(obj: Any, path: PathLike) -> None:
+    """
+    Serialize `obj` to `path` as UTF-8, 2-space indented JSON.
+    
+    Numpy arrays (e.g. embeddings) are serialized directly.
+    """
+    Path(path).write_bytes(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2)
+    )
@@ -0,0 +1,261 @@
+"""
+Persistent Cache Utilities
+==========================
+SQLite-backed cache for slow, metered Gemini results that should survive
+server restarts (poster identification, supplemental themes, YouTube IDs).
+
+Layout:
+- `cache` table: (namespace, key) → orjson-encoded value + expiry
+- `poster_hashes` table: 64-bit dHash → identification result + expiry,
+  for near-duplicate poster lookups (re-encoded / resized uploads)
+
+SQLite ships with Python and is a single file next to the other data, so
+there is no extra service to run. Queries take well under a millisecond
+and run in a worker thread to keep the event loop free.
+
+Cache failures never break a request: errors are logged and treated as
+misses.
+"""
+
+import asyncio
+import functools
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import orjson
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Same data directory convention as api/routes.py
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+CACHE_DB_PATH = Path(os.getenv(
+    "CACHE_DB_PATH",
+    str(Path(os.getenv("DATA_DIR_PATH", str(PROJECT_ROOT / "data"))) / "cache.sqlite3")
+))
+
+# dHash grid: 9x8 grayscale → 64 left/right gradient bits
+DHASH_SIZE = 8
+
+# Expired rows are deleted on open and every PRUNE_EVERY writes
+PRUNE_EVERY = 256
+
+# Near-duplicate lookups scan every poster hash, so keep only the newest
+# MAX_POSTER_HASHES (a hash and a small JSON value each)
+MAX_POSTER_HASHES = 20_000
+
+
+def image_dhash(image_data: bytes) -> int:
+    """
+    Compute a 64-bit difference hash (dHash) of an image.
+    
+    Visually identical images (re-encoded, resized, slightly recompressed)
+    get hashes within a few bits of each other.
+    
+    Args:
+        image_data: Raw image bytes
+    
+    Returns:
+        Unsigned 64-bit hash
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        small = image.convert('L').resize(
+            (DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.LANCZOS
+        )
+    pixels = list(small.getdata())
+    
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def _to_signed64(value: int) -> int:
+    """SQLite INTEGER is signed 64-bit."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class PersistentCache:
+    """Thread-safe SQLite key/value store with per-entry expiry."""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL,"
+                " value BLOB NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS poster_hashes ("
+                " dhash INTEGER PRIMARY KEY,"
+                " value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+        self._writes = 0
+        self.prune()
+    
+    def prune(self):
+        """Delete expired rows and cap poster_hashes at MAX_POSTER_HASHES."""
+        with self._lock, self._conn:
+            now = time.time()
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            self._conn.execute("DELETE FROM poster_hashes WHERE expires_at <= ?", (now,))
+            # Entries share one TTL, so the earliest expiry is the oldest entry
+            self._conn.execute(
+                "DELETE FROM poster_hashes WHERE dhash IN ("
+                " SELECT dhash FROM poster_hashes ORDER BY expires_at DESC"
+                " LIMIT -1 OFFSET ?)",
+                (MAX_POSTER_HASHES,)
+            )
+    
+    def _count_write(self):
+        """Prune every PRUNE_EVERY writes so expired rows don't pile up."""
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+    
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """Return the raw stored value, or None if missing/expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, namespace: str, key: str, value: bytes, ttl: float):
+        """Store a raw value for `ttl` seconds."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, time.time() + ttl)
+            )
+        self._count_write()
+    
+    def find_near_image(self, dhash: int, max_distance: int) -> Optional[bytes]:
+        """
+        Return the value stored for the closest poster hash within
+        `max_distance` differing bits, or None.
+        
+        Trade-off: a hit returns the result cached for a *different* upload
+        that only looks alike at 9x8 pixels, without re-checking it. A few
+        bits of distance catches re-encodes and resizes, but two
+        similar-looking posters (e.g. seasons of one show) can share an
+        identification. Scans the whole table (capped at MAX_POSTER_HASHES).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dhash, value FROM poster_hashes WHERE expires_at > ?",
+                (time.time(),)
+            ).fetchall()
+        
+        target = dhash
+        best = None
+        best_distance = max_distance + 1
+        for stored, value in rows:
+            distance = ((stored & 0xFFFFFFFFFFFFFFFF) ^ target).bit_count()
+            if distance < best_distance:
+                best, best_distance = value, distance
+        return best
+    
+    def set_image(self, dhash: int, value: bytes, ttl: float):
+        """Store a value under a poster hash for `ttl` seconds."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO poster_hashes (dhash, value, expires_at) VALUES (?, ?, ?)",
+                (_to_signed64(dhash), value, time.time() + ttl)
+            )
+        self._count_write()
+
+
+_cache: Optional[PersistentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_persistent_cache() -> Optional[PersistentCache]:
+    """
+    Return the shared cache, opening the database on first use.
+    
+    Returns None (caching disabled) if the database cannot be opened.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = PersistentCache(CACHE_DB_PATH)
+                    logger.info(f"[OK] Persistent cache: {CACHE_DB_PATH}")
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"[WARNING] Persistent cache disabled: {e}")
+                    return None
+    return _cache
+
+
+async def cache_call(method: str, *args) -> Any:
+    """
+    Run a PersistentCache method in a worker thread.
+    
+    Returns None (a miss) if the cache is unavailable or the call fails.
+    """
+    cache = get_persistent_cache()
+    if cache is None:
+        return None
+    try:
+        return await asyncio.to_thread(getattr(cache, method), *args)
+    except sqlite3.Error as e:
+        logger.warning(f"[WARNING] Persistent cache {method} failed: {e}")
+        return None
+
+
+def persistent_cache(
+    namespace: str,
+    ttl: float,
+    key: Callable[..., str],
+    encode: Callable[[Any], Any] = lambda value: value,
+    decode: Callable[[Any], Any] = lambda data: data,
+    negative_ttl: Optional[float] = None
+):
+    """
+    Decorate an async function with a SQLite-backed cache.
+    
+    Args:
+        namespace: Cache namespace (one per function)
+        ttl: Seconds an entry stays fresh
+        key: Function mapping the call arguments to a string key
+        encode: Converts the result to something orjson can serialize
+        decode: Rebuilds the result from the deserialized value
+        negative_ttl: Optional shorter TTL for empty results (None, [], {})
+    
+    Exceptions are never cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            
+            raw = await cache_call('get', namespace, cache_key)
+            if raw is not None:
+                return decode(orjson.loads(raw))
+            
+            value = await func(*args, **kwargs)
+            
+            entry_ttl = negative_ttl if negative_ttl is not None and not value else ttl
+            await cache_call('set', namespace, cache_key, orjson.dumps(encode(value)), entry_ttl)
+            return value
+        
+        return wrapper
+    
+    return decorator